@@ -0,0 +1,92 @@
+class AdaptiveController:
+    """
+    Pick the processing width and decode rate from what the decoder sees.
+
+    A large, close QR code decodes fine at a low resolution, so the width is
+    shrunk while the code stays comfortably above min_code_px. A small code
+    or repeated misses grow the width back to regain range. Independently,
+    the decode interval (skip_frames) is raised when the smoothed decode
+    latency exceeds the budget and lowered again when there is headroom.
+    """
+
+    def __init__(self, width, min_width=240, max_width=1280, latency_budget=0.05,
+                 min_code_px=60, max_code_px=140, miss_limit=3, step=1.25,
+                 max_skip=4, cooldown=10, smoothing=0.2):
+        """
+        Args:
+            width: Starting processing width
+            min_width, max_width: Processing width range
+            latency_budget: Target decode latency in seconds
+            min_code_px: Grow the width when the code is narrower than this
+            max_code_px: Shrink the width when the code is wider than this
+            miss_limit: Consecutive misses before growing the width
+            step: Width change factor
+            max_skip: Highest decode interval (decode every Nth frame)
+            cooldown: Decodes to wait between two changes of the same setting
+            smoothing: Weight of the newest sample in the latency average
+        """
+        self.width = width
+        self.min_width = min_width
+        self.max_width = max(min_width, max_width)
+        self.latency_budget = latency_budget
+        self.min_code_px = min_code_px
+        self.max_code_px = max_code_px
+        self.miss_limit = miss_limit
+        self.step = step
+        self.max_skip = max_skip
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+
+        self.skip_frames = 1
+        self.latency = None
+        self.misses = 0
+        self._width_cooldown = 0
+        self._skip_cooldown = 0
+
+    def update(self, decode_time, code_width):
+        """
+        Feed one decode result
+
+        Args:
+            decode_time: Time the decode took in seconds
+            code_width: Width in pixels of the largest code, or None if nothing was found
+
+        Returns:
+            (width, skip_frames) to use from now on
+        """
+        if self.latency is None:
+            self.latency = decode_time
+        else:
+            self.latency += self.smoothing * (decode_time - self.latency)
+
+        self._width_cooldown = max(0, self._width_cooldown - 1)
+        self._skip_cooldown = max(0, self._skip_cooldown - 1)
+        self.misses = 0 if code_width is not None else self.misses + 1
+
+        # Resolution: keep the code within a comfortable pixel size
+        new_width = self.width
+        if code_width is not None and code_width > self.max_code_px:
+            new_width = self.width / self.step
+        elif (code_width is not None and code_width < self.min_code_px) or self.misses >= self.miss_limit:
+            new_width = self.width * self.step
+        if new_width != self.width:
+            # Round a changed width down to a multiple of 16, but never past the limits.
+            # An unchanged width is kept as given, even if it is not a multiple of 16.
+            new_width = min(self.max_width, max(self.min_width, int(new_width) // 16 * 16))
+        if new_width != self.width and not self._width_cooldown:
+            self.width = new_width
+            self.misses = 0
+            self._width_cooldown = self.cooldown
+            # The latency average no longer applies to the new resolution
+            self.latency = None
+
+        # Decode rate: stay within the latency budget
+        if self.latency is not None and not self._skip_cooldown:
+            if self.latency > self.latency_budget and self.skip_frames < self.max_skip:
+                self.skip_frames += 1
+                self._skip_cooldown = self.cooldown
+            elif self.latency < self.latency_budget / 2 and self.skip_frames > 1:
+                self.skip_frames -= 1
+                self._skip_cooldown = self.cooldown
+
+        return self.width, self.skip_frames
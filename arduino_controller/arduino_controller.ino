@@ -15,6 +15,26 @@ const int IN4 = 7;  // Direction control
 // Speed settings
 const int SPEED = 150;  // 0-255 for PWM
 
+// Stop watchdog: stop the motors if the host goes quiet.
+// The Python side re-sends the current command every 200 ms as a keep-alive.
+const unsigned long WATCHDOG_TIMEOUT = 500;  // ms
+unsigned long lastCommandTime = 0;
+bool motorsRunning = false;
+
+// Variable-speed motor frames: 0xFF, left, right, checksum
+// left/right are percent (-100..100) in steps of 2%: MOTOR_SPEED_ZERO + percent / 2,
+// checksum = 0x80 | ((left + right) % 127). Every byte after the header has the
+// high bit set and is never 0xFF, so payload bytes can't pass for commands or headers.
+const byte MOTOR_FRAME_HEADER = 0xFF;
+const byte MOTOR_SPEED_ZERO = 0xB2;
+const unsigned long FRAME_TIMEOUT = 20;  // ms, a frame takes about 4 ms at 9600 baud
+const unsigned long BAD_FRAME_HOLDOFF = 100;  // ms to ignore commands after a broken frame
+byte motorFrame[3];
+int motorFrameIndex = -1;  // -1 while not inside a frame
+unsigned long motorFrameStart = 0;
+bool badFrame = false;  // Until the next good frame or BAD_FRAME_HOLDOFF
+unsigned long badFrameTime = 0;
+
 void setup() {
   // Initialize serial communication
   Serial.begin(9600);
@@ -35,13 +55,56 @@ void setup() {
 
 void loop() {
   // Check if data is available from Python
-  if (Serial.available() > 0) {
-    char command = Serial.read();
-    executeCommand(command);
+  while (Serial.available() > 0) {
+    byte data = Serial.read();
+    
+    // Drop a half-received frame whose other bytes were lost
+    if (motorFrameIndex >= 0 && millis() - motorFrameStart > FRAME_TIMEOUT) {
+      dropMotorFrame();
+    }
+    
+    if (data == MOTOR_FRAME_HEADER) {
+      // The header never appears inside a frame, so it always starts a new one
+      if (motorFrameIndex >= 0) {
+        dropMotorFrame();
+      }
+      motorFrameIndex = 0;
+      motorFrameStart = millis();
+      continue;
+    }
+    
+    if (data & 0x80) {
+      // Inside a motor frame, collect the payload. Outside of one it is the
+      // rest of a frame whose header was lost, ignore it.
+      if (motorFrameIndex >= 0) {
+        motorFrame[motorFrameIndex++] = data;
+        if (motorFrameIndex == 3) {
+          motorFrameIndex = -1;
+          executeMotorFrame();
+        }
+      }
+      continue;
+    }
+    
+    // Single-character command: it breaks a frame in progress, and right after
+    // a broken frame only a stop is trusted
+    if (motorFrameIndex >= 0) {
+      dropMotorFrame();
+    }
+    if (badFrame && millis() - badFrameTime < BAD_FRAME_HOLDOFF && data != 'S') {
+      continue;
+    }
+    executeCommand((char)data);
+  }
+  
+  // Host stalled or disconnected, don't keep running on the last command
+  if (motorsRunning && millis() - lastCommandTime > WATCHDOG_TIMEOUT) {
+    stopMotors();
   }
 }
 
 void executeCommand(char command) {
+  lastCommandTime = millis();
   switch (command) {
     case 'F':  // Move forward
       moveForward();
@@ -64,7 +127,48 @@ void executeCommand(char command) {
   }
 }
 
+void dropMotorFrame() {
+  motorFrameIndex = -1;
+  badFrame = true;
+  badFrameTime = millis();
+}
+
+void executeMotorFrame() {
+  // Drop corrupted frames
+  if ((0x80 | ((motorFrame[0] + motorFrame[1]) % 127)) != motorFrame[2]) {
+    dropMotorFrame();
+    return;
+  }
+  badFrame = false;
+  lastCommandTime = millis();
+  
+  int leftSpeed = ((int)motorFrame[0] - MOTOR_SPEED_ZERO) * 2;
+  int rightSpeed = ((int)motorFrame[1] - MOTOR_SPEED_ZERO) * 2;
+  setMotor(ENA, IN1, IN2, leftSpeed);
+  setMotor(ENB, IN3, IN4, rightSpeed);
+  motorsRunning = leftSpeed != 0 || rightSpeed != 0;
+}
+
+void setMotor(int enablePin, int forwardPin, int backwardPin, int speedPercent) {
+  speedPercent = constrain(speedPercent, -100, 100);
+  int pwm = map(abs(speedPercent), 0, 100, 0, 255);
+  
+  if (speedPercent > 0) {
+    digitalWrite(forwardPin, HIGH);
+    digitalWrite(backwardPin, LOW);
+  } else if (speedPercent < 0) {
+    digitalWrite(forwardPin, LOW);
+    digitalWrite(backwardPin, HIGH);
+  } else {
+    digitalWrite(forwardPin, LOW);
+    digitalWrite(backwardPin, LOW);
+  }
+  analogWrite(enablePin, pwm);
+}
+
 void moveForward() {
+  motorsRunning = true;
+  
   // Left motor forward
   digitalWrite(IN1, HIGH);
   digitalWrite(IN2, LOW);
@@ -77,6 +181,8 @@ void moveForward() {
 }
 
 void moveBackward() {
+  motorsRunning = true;
+  
   // Left motor backward
   digitalWrite(IN1, LOW);
   digitalWrite(IN2, HIGH);
@@ -89,6 +195,8 @@ void moveBackward() {
 }
 
 void turnLeft() {
+  motorsRunning = true;
+  
   // Left motor stop or reverse
   digitalWrite(IN1, LOW);
   digitalWrite(IN2, HIGH);
@@ -101,6 +209,8 @@ void turnLeft() {
 }
 
 void turnRight() {
+  motorsRunning = true;
+  
   // Left motor forward
   digitalWrite(IN1, HIGH);
   digitalWrite(IN2, LOW);
@@ -113,6 +223,8 @@ void turnRight() {
 }
 
 void stopMotors() {
+  motorsRunning = false;
+  
   // Stop both motors
   digitalWrite(IN1, LOW);
   digitalWrite(IN2, LOW);
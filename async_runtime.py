@@ -0,0 +1,447 @@
+import asyncio
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import serial
+
+from qr_prefilter import detect_regions
+from serial_writer import _command_bytes
+
+try:
+    import serial_asyncio  # pyserial-asyncio, optional
+except ImportError:
+    serial_asyncio = None
+
+
+class DropOldestQueue(asyncio.Queue):
+    """
+    Bounded asyncio queue that never blocks the producer.
+
+    When the queue is full, put_nowait() discards the oldest item to make
+    room, so a slow consumer always gets the most recent data. Discarded
+    items are counted in dropped.
+    """
+
+    def __init__(self, maxsize=1):
+        super().__init__(maxsize=maxsize)
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        """
+        Add an item, dropping the oldest one if the queue is full
+
+        Returns:
+            True if an older item was dropped
+        """
+        dropped = False
+        if self.full():
+            self.get_nowait()
+            self.dropped += 1
+            dropped = True
+        super().put_nowait(item)
+        return dropped
+
+
+class _DiscardProtocol(asyncio.Protocol):
+    """The Arduino's replies are not used, only the write side of the link"""
+
+    def data_received(self, data):
+        pass
+
+
+class AsyncSerialWriter:
+    """
+    Asyncio counterpart of SerialCommandWriter with the same submit() API.
+
+    The pending command lives in a one-slot DropOldestQueue, so a newer
+    command replaces one that has not been written yet. Writes are paced by
+    min_interval and the last command is re-sent every keepalive_interval
+    for the Arduino watchdog. A real serial port is driven through a
+    pyserial-asyncio transport when that package is installed; otherwise
+    (or for stand-ins like FakeSerial) writes go through a one-thread
+    executor so they never block the event loop.
+    """
+
+    def __init__(self, port, min_interval=0.05, keepalive_interval=0.2, latency=None):
+        """
+        Args:
+            port: An open serial.Serial (or anything with write())
+            min_interval: Minimum time between two writes in seconds
+            keepalive_interval: Re-send the last command after this many idle seconds
+            latency: Optional LatencyTracker for serial_write and glass_to_command
+        """
+        self.port = port
+        self.min_interval = min_interval
+        self.keepalive_interval = keepalive_interval
+        self.latency = latency
+
+        self._slot = DropOldestQueue(maxsize=1)
+        self._transport = None
+        self._executor = None
+        self._task = None
+        self._closing = False
+
+        # Statistics
+        self.commands_sent = 0
+        self.keepalives_sent = 0
+
+    @property
+    def commands_coalesced(self):
+        return self._slot.dropped
+
+    async def start(self):
+        """Open the transport and start the writer task"""
+        loop = asyncio.get_running_loop()
+        if serial_asyncio is not None and isinstance(self.port, serial.Serial):
+            self._transport = serial_asyncio.SerialTransport(loop, _DiscardProtocol(), self.port)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SerialWrite")
+        self._task = asyncio.create_task(self._write_loop(), name="serial")
+        return self
+
+    def submit(self, command, frame_time=None):
+        """
+        Queue a command, replacing any command that has not been sent yet
+
+        Args:
+            command: Single-character command or encoded motor frame (bytes)
+            frame_time: Capture time of the frame the command was computed from
+        """
+        if self._closing:
+            return
+        self._slot.put_nowait((command, frame_time))
+
+    async def _write_loop(self):
+        last_sent = None
+        last_write_time = 0.0
+        while True:
+            timeout = None
+            if last_sent is not None:
+                timeout = max(0.0, last_write_time + self.keepalive_interval - time.time())
+            try:
+                item = await asyncio.wait_for(self._slot.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is None:
+                if self._closing:
+                    return
+                # Nothing new, feed the watchdog with the last command
+                await self._write(last_sent, None)
+                self.keepalives_sent += 1
+            else:
+                delay = last_write_time + self.min_interval - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    if not self._slot.empty():
+                        # A newer command arrived while pacing, send that one instead
+                        self._slot.dropped += 1
+                        item = self._slot.get_nowait()
+                command, frame_time = item
+                await self._write(command, frame_time)
+                last_sent = command
+                self.commands_sent += 1
+            last_write_time = time.time()
+
+            if self._closing and self._slot.empty():
+                return
+
+    async def _write(self, command, frame_time):
+        data = _command_bytes(command)
+        start = time.perf_counter()
+        try:
+            if self._transport is not None:
+                self._transport.write(data)
+            else:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self.port.write, data)
+        except (serial.SerialException, OSError) as e:
+            print(f"Warning: Serial write failed: {e}")
+        if self.latency is not None:
+            self.latency.record('serial_write', time.perf_counter() - start)
+            if frame_time is not None:
+                self.latency.record('glass_to_command', time.time() - frame_time)
+
+    async def aclose(self, timeout=1.0):
+        """Flush the pending command and stop the writer task"""
+        if self._closing:
+            return
+        self._closing = True
+        if self._slot.empty():
+            self._slot.put_nowait(None)  # Wake the writer so it can exit
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+        if self._transport is not None:
+            self._transport.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def close(self, timeout=1.0):
+        """Synchronous close for QRNavigationRobot.close(), once aclose() has run"""
+        self._closing = True
+
+
+class AsyncNavigationRuntime:
+    """
+    Run a QRNavigationRobot as concurrent asyncio tasks.
+
+    capture -> decode -> control stages are connected by bounded
+    DropOldestQueues, so a slow stage only ever sees the newest data and
+    never builds up a backlog. Blocking work runs in executors: frame
+    reads and preprocessing on one thread, QR decoding on another. Tracking
+    state, navigation, serial writes, display and telemetry stay on the
+    event loop, so the robot's state is only changed from one thread.
+    """
+
+    def __init__(self, robot, frame_queue_size=1, result_queue_size=1, control_interval=1 / 30,
+                 telemetry_interval=1.0, telemetry_callbacks=None):
+        """
+        Args:
+            robot: A QRNavigationRobot (its run() is not used)
+            frame_queue_size: Frames waiting for the decoder
+            result_queue_size: Decode results waiting for the controller
+            control_interval: Steer on the tracker prediction when no decode
+                              result arrived for this long (seconds)
+            telemetry_interval: Seconds between telemetry snapshots
+            telemetry_callbacks: Functions or coroutines called with each
+                                 snapshot dict (default: print a status line
+                                 when headless)
+        """
+        self.robot = robot
+        self.control_interval = control_interval
+        self.telemetry_interval = telemetry_interval
+        if telemetry_callbacks is None:
+            telemetry_callbacks = [self._print_telemetry] if robot.headless else []
+        self.telemetry_callbacks = list(telemetry_callbacks)
+
+        self.frames = DropOldestQueue(frame_queue_size)
+        self.results = DropOldestQueue(result_queue_size)
+        self.display_frames = DropOldestQueue(1)
+        self.telemetry = {}
+
+        self._capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Capture")
+        self._decode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Decode")
+        self._latest_frame_time = None
+        self._stop = None
+
+    def stop(self):
+        """Ask the runtime to shut down (safe to call from the event loop)"""
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self):
+        robot = self.robot
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        installed = self._install_signal_handlers(loop)
+
+        # Swap the threaded serial writer for the asyncio one
+        if robot.serial_writer is not None:
+            robot.serial_writer.close()
+            robot.serial_writer = await AsyncSerialWriter(robot.arduino, latency=robot.latency).start()
+
+        robot.grabber.start()
+        if robot.detector is None:
+            await loop.run_in_executor(self._capture_executor, robot.calibrate_detector)
+        robot.running = True
+
+        stages = [
+            asyncio.create_task(self._capture_stage(), name="capture"),
+            asyncio.create_task(self._decode_stage(), name="decode"),
+            asyncio.create_task(self._control_stage(), name="control"),
+            asyncio.create_task(self._telemetry_stage(), name="telemetry"),
+            asyncio.create_task(self._display_stage(), name="display"),
+        ]
+        stop_waiter = asyncio.create_task(self._stop.wait())
+        done, _ = await asyncio.wait(stages + [stop_waiter], return_when=asyncio.FIRST_COMPLETED)
+
+        # A stage that ended on its own (camera failure, 'q' pressed) stops everything
+        for task in stages + [stop_waiter]:
+            task.cancel()
+        await asyncio.gather(*stages, stop_waiter, return_exceptions=True)
+        for task in done:
+            if task is not stop_waiter and not task.cancelled() and task.exception() is not None:
+                print(f"Stage '{task.get_name()}' failed: {task.exception()!r}")
+
+        # Stop the motors before anything else is torn down
+        robot.running = False
+        if isinstance(robot.serial_writer, AsyncSerialWriter):
+            robot.serial_writer.submit('S')
+            await robot.serial_writer.aclose()
+        print(f"Queue drops: frames {self.frames.dropped}, results {self.results.dropped}")
+
+        for sig in installed:
+            loop.remove_signal_handler(sig)
+        self._capture_executor.shutdown(wait=False)
+        self._decode_executor.shutdown(wait=True)
+        if not robot.headless:
+            cv2.destroyAllWindows()
+        robot.close()
+
+    def _install_signal_handlers(self, loop):
+        installed = []
+        for sig in (signal.SIGINT, getattr(signal, 'SIGTERM', None)):
+            if sig is None:
+                continue
+            try:
+                loop.add_signal_handler(sig, self._handle_signal, sig)
+            except (NotImplementedError, RuntimeError):
+                continue  # Windows, or not on the main thread: Ctrl+C raises instead
+            installed.append(sig)
+        return installed
+
+    def _handle_signal(self, signum):
+        print(f"\nReceived signal {signum}, stopping...")
+        self.stop()
+
+    def _grab(self):
+        """Capture thread: wait for a new frame and convert it for decoding"""
+        robot = self.robot
+        start = time.perf_counter()
+        ret, frame, frame_time = robot.grabber.read(timeout=0.5)
+        robot.latency.record('capture_wait', time.perf_counter() - start)
+        if not ret:
+            return 'failed' if robot.grabber.failed else None
+
+        robot.frame_count += 1
+        if robot.frame_count % robot.skip_frames != 0:
+            return frame_time, None
+
+        # Copies: the grabber and preprocessor buffers are reused by the next frame
+        with robot.latency.measure('preprocess'):
+            width = robot.resize_width
+            gray = robot.preprocessor.gray(frame).copy()
+            preview = robot.headless and robot._preview_due()
+            color = None
+            if not robot.headless or preview or robot._stream_due():
+                color = robot.preprocessor.color(frame).copy()
+        return frame_time, (width, gray, color, preview)
+
+    async def _capture_stage(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            result = await loop.run_in_executor(self._capture_executor, self._grab)
+            if result == 'failed':
+                print("Failed to retrieve frame from camera")
+                return
+            if result is None:
+                if not self.robot.grabber.connected:
+                    self.robot.handle_stream_lost()
+                continue
+            if self.robot.stream_lost:
+                self.robot.handle_stream_resumed()
+            frame_time, work = result
+            self._latest_frame_time = frame_time
+            if work is not None:
+                self.frames.put_nowait((frame_time,) + work)
+
+    @staticmethod
+    def _detect(detector, gray, roi, prefilter):
+        """Decode thread: run the backend on the frame, its ROI crop or its prefilter candidates"""
+        start = time.perf_counter()
+        if roi is None and prefilter is not None:
+            return detect_regions(detector, gray, prefilter.candidates(gray)), time.perf_counter() - start
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            gray = gray[y0:y1, x0:x1]
+        return detector.detect(gray), time.perf_counter() - start
+
+    async def _decode_stage(self):
+        robot = self.robot
+        loop = asyncio.get_running_loop()
+        while True:
+            frame_time, width, gray, color, preview = await self.frames.get()
+            if width != robot.resize_width:
+                continue  # Captured before the processing resolution changed
+
+            # Backend and ROI are planned on the loop, tracking state is updated there too
+            detector = robot._active_detector()
+            roi = robot._tracking_roi(gray.shape)
+            decoded_objects, decode_time = await loop.run_in_executor(
+                self._decode_executor, self._detect, detector, gray, roi, robot.prefilter)
+            robot.latency.record('decode', decode_time)
+            robot.last_decode_time = decode_time
+            if width != robot.resize_width:
+                continue
+
+            decoded_objects = robot._finish_scan(detector, roi, decoded_objects)
+            objects = robot._handle_detections(decoded_objects)
+            self.results.put_nowait((frame_time, objects, (color, preview)))
+
+    async def _control_stage(self):
+        robot = self.robot
+        while True:
+            display = None
+            try:
+                frame_time, objects, display = await asyncio.wait_for(self.results.get(), self.control_interval)
+            except asyncio.TimeoutError:
+                # No new decode, keep steering on the predicted position
+                frame_time, objects = self._latest_frame_time, None
+            if frame_time is None or robot.stream_lost:
+                continue  # Nothing to steer on, or stopped until the camera is back
+            robot.frame_time = frame_time
+
+            with robot.latency.measure('navigate'):
+                result = robot.navigate_tracked(objects)
+            if result is not None:
+                robot.last_status, robot.last_tracked_object = result
+            if objects is not None:
+                robot.processed_count += 1
+                if robot.adaptive is not None:
+                    robot._adapt(objects)
+            robot._update_fps()
+
+            if display is not None and display[0] is not None:
+                self.display_frames.put_nowait(display)
+
+    async def _display_stage(self):
+        """Draw on the latest processed frame, then show, stream or write it as the preview"""
+        robot = self.robot
+        if robot.headless and not robot.preview_file and robot.telemetry_server is None:
+            return await asyncio.Event().wait()  # Nothing to display
+
+        while True:
+            frame, preview = await self.display_frames.get()
+            if frame.shape[1] != robot.resize_width:
+                continue
+            with robot.latency.measure('draw'):
+                robot._draw_detections(frame, robot.last_detections)
+                robot._draw_navigation_info(frame, robot.last_status, robot.last_tracked_object)
+            if robot.telemetry_server is not None:
+                robot.telemetry_server.publish_frame(frame)
+
+            if robot.headless:
+                if preview:
+                    with robot.latency.measure('preview'):
+                        robot._write_preview(frame)
+                continue
+
+            # HighGUI has to stay on the thread that created the window
+            with robot.latency.measure('imshow'):
+                cv2.imshow("QR Navigation", frame)
+                key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                return
+
+    async def _telemetry_stage(self):
+        while True:
+            await asyncio.sleep(self.telemetry_interval)
+            snapshot = self.robot.status_snapshot()
+            snapshot['queue_drops'] = {'frames': self.frames.dropped, 'results': self.results.dropped}
+            self.telemetry = snapshot
+            for callback in self.telemetry_callbacks:
+                try:
+                    result = callback(snapshot)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    print(f"Telemetry callback error: {e}")
+
+    @staticmethod
+    def _print_telemetry(snapshot):
+        print(f"[{time.strftime('%H:%M:%S')}] {snapshot['status']} | cmd {snapshot['last_command']} | "
+              f"{snapshot['fps']} fps, {snapshot['processed_fps']} decoded/s")
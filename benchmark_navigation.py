@@ -0,0 +1,241 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from camera_stream import ReplayCapture
+from latency_stats import LatencyTracker
+from navigation_robot import QRNavigationRobot
+from route import load_route
+from serial_writer import FakeSerial
+
+
+def run_benchmark(recording, detector='pyzbar', resize_width=640, realtime=False,
+                  max_frames=None, measure_allocations=False, **robot_options):
+    """
+    Replay a recording through the navigation pipeline with a fake serial port
+
+    Args:
+        recording: Video recorded with record_stream.py
+        detector: QR detector backend name (or 'auto')
+        resize_width: Frame processing width
+        realtime: Replay at the recorded frame rate through the frame grabber,
+                  dropping stale frames like the live stream; otherwise every
+                  frame is processed as fast as possible
+        max_frames: Stop after this many processed frames
+        measure_allocations: Track bytes allocated per frame with tracemalloc
+        robot_options: Extra QRNavigationRobot keyword arguments
+
+    Returns:
+        Dict with throughput, detection rate, stage latencies and commands
+    """
+    capture = ReplayCapture(recording, realtime=realtime)
+    fake_serial = FakeSerial()
+    robot = QRNavigationRobot(recording, None, resize_width=resize_width, detector=detector,
+                              capture=capture, serial_port=fake_serial, **robot_options)
+
+    if realtime:
+        robot.grabber.start()
+        read_frame = lambda: robot.grabber.read(timeout=5.0)
+    else:
+        # Decode every frame into the same buffer, like the frame grabber does
+        frame_buffer = [None]
+
+        def read_frame():
+            ret, frame = capture.read(frame_buffer[0])
+            if ret:
+                frame_buffer[0] = frame
+            return ret, frame, time.time()
+
+    if robot.detector is None:
+        robot.calibrate_detector(lambda: read_frame()[:2])
+
+    # Keep every sample of the outer pipeline stages for the whole run
+    stages = LatencyTracker(size=None)
+    frames_processed = 0
+    frames_detected = 0
+    start_time = time.time()
+
+    # Transient allocations per frame (numpy and OpenCV buffers are traced too)
+    allocations = []
+    if measure_allocations:
+        tracemalloc.start()
+
+    while max_frames is None or frames_processed < max_frames:
+        if measure_allocations:
+            tracemalloc.reset_peak()
+            baseline_memory = tracemalloc.get_traced_memory()[0]
+
+        t0 = time.perf_counter()
+        ret, frame, frame_time = read_frame()
+        t1 = time.perf_counter()
+        if not ret:
+            break
+        robot.frame_time = frame_time
+
+        gray = robot.preprocessor.gray(frame)
+        t2 = time.perf_counter()
+        if robot.decode_workers:
+            # Without realtime pacing wait for a free worker so every frame is decoded
+            objects = robot.decode_gray_pooled(gray, block=not realtime)
+            if objects is None:
+                robot.navigate_tracked(None)  # Steer on the prediction while decoding
+                continue
+        else:
+            objects = robot.decode_gray(gray)
+        t3 = time.perf_counter()
+        status, tracked_object = robot.navigate_tracked(objects)
+        if robot.adaptive is not None:
+            robot._adapt(objects)
+        t4 = time.perf_counter()
+        if not robot.headless:
+            robot.annotate_frame(frame, status, tracked_object)
+        t5 = time.perf_counter()
+
+        stages.record('capture', t1 - t0, t1)
+        stages.record('preprocess', t2 - t1, t2)
+        stages.record('detect', t3 - t2, t3)
+        stages.record('navigate', t4 - t3, t4)
+        if not robot.headless:
+            stages.record('draw', t5 - t4, t5)
+        stages.record('total', t5 - t0, t5)
+
+        if measure_allocations:
+            allocations.append(tracemalloc.get_traced_memory()[1] - baseline_memory)
+
+        frames_processed += 1
+        if objects:
+            frames_detected += 1
+
+    if measure_allocations:
+        tracemalloc.stop()
+
+    elapsed = time.time() - start_time
+    robot.close()
+
+    return {
+        'recording': recording,
+        'detector': robot.detector.name,
+        'resize_width': robot.resize_width,
+        'skip_frames': robot.skip_frames,
+        'realtime': realtime,
+        'frames_processed': frames_processed,
+        'frames_dropped': robot.grabber.frames_dropped,
+        'elapsed_s': round(elapsed, 3),
+        'decodes_per_sec': round(frames_processed / elapsed, 2) if elapsed > 0 else 0.0,
+        'detection_rate': round(frames_detected / frames_processed, 4) if frames_processed else 0.0,
+        'prefilter': robot.prefilter.stats() if robot.prefilter is not None else None,
+        'latency_ms': stages.summary(),
+        'pipeline_latency_ms': robot.latency.summary(),
+        # Median over the second half of the run, once buffers have been allocated
+        'allocated_bytes_per_frame': (int(np.median(allocations[len(allocations) // 2:]))
+                                      if allocations else None),
+        'commands': [[round(t - start_time, 3), cmd] for t, cmd in fake_serial.commands()],
+    }
+
+
+def print_report(report, baseline=None):
+    """Print a benchmark report, with the change against a baseline report if given"""
+    def delta(key):
+        if baseline is None or not baseline.get(key):
+            return ""
+        change = (report[key] - baseline[key]) / baseline[key] * 100
+        return f" ({change:+.1f}% vs baseline)"
+
+    print(f"\n===== Benchmark: {report['recording']} =====")
+    print(f"Detector: {report['detector']}  Width: {report['resize_width']}  "
+          f"Realtime: {report['realtime']}")
+    print(f"Frames processed: {report['frames_processed']}  dropped: {report['frames_dropped']}")
+    print(f"Decodes/sec: {report['decodes_per_sec']:.1f}{delta('decodes_per_sec')}")
+    print(f"Detection rate: {report['detection_rate'] * 100:.1f}%{delta('detection_rate')}")
+    if report.get('prefilter'):
+        prefilter = report['prefilter']
+        print(f"Prefilter: {prefilter['frames_filtered']} of {prefilter['frames_checked']} full scans skipped")
+    if report.get('allocated_bytes_per_frame') is not None:
+        print(f"Allocated per frame (steady state): {report['allocated_bytes_per_frame']} bytes")
+
+    print("\nLatency (ms)      p50      p95      p99")
+    for stage, summary in report['latency_ms'].items():
+        print(f"  {stage:<12}{summary['p50']:9.2f}{summary['p95']:9.2f}{summary['p99']:9.2f}")
+
+    commands = ", ".join(cmd for _, cmd in report['commands'])
+    print(f"\nCommands ({len(report['commands'])}): {commands}")
+    if baseline is not None and baseline.get('commands') is not None:
+        same = [c for _, c in baseline['commands']] == [c for _, c in report['commands']]
+        print(f"Command sequence {'matches' if same else 'differs from'} baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the navigation pipeline on a recorded stream')
+    parser.add_argument('--recording', type=str, required=True,
+                        help='Video recorded with record_stream.py')
+    parser.add_argument('--detector', type=str, default='pyzbar',
+                        help='QR detector backend, or auto')
+    parser.add_argument('--resize-width', type=int, default=640,
+                        help='Frame processing width')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Replay at the recorded frame rate and drop stale frames')
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='Stop after this many processed frames')
+    parser.add_argument('--target-payload', type=str, default=None,
+                        help='Expected QR payload for the localization fast path')
+    parser.add_argument('--route', type=str, default=None,
+                        help='Follow these waypoint payloads (comma separated or a file)')
+    parser.add_argument('--no-roi', action='store_true',
+                        help='Disable ROI tracking')
+    parser.add_argument('--headless', action='store_true',
+                        help='Skip the annotation copy and drawing like the headless robot')
+    parser.add_argument('--decode-workers', type=int, default=0,
+                        help='Decode on this many worker processes')
+    parser.add_argument('--track-missed-frames', type=int, default=5,
+                        help='Missed decodes bridged by the motion tracker (0 disables it)')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Let the adaptive controller change the processing width')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Skip decoding frames without QR-like regions')
+    parser.add_argument('--measure-allocations', action='store_true',
+                        help='Report bytes allocated per frame (slower, uses tracemalloc)')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Write a Chrome trace (chrome://tracing) of the run to this file')
+    parser.add_argument('--json', type=str, default=None,
+                        help='Write the report to this JSON file')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='JSON report of an earlier run to compare against')
+
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        args.recording,
+        detector=args.detector,
+        resize_width=args.resize_width,
+        realtime=args.realtime,
+        max_frames=args.max_frames,
+        measure_allocations=args.measure_allocations,
+        target_payload=args.target_payload,
+        route=load_route(args.route) if args.route else None,
+        roi_tracking=not args.no_roi,
+        trace_file=args.trace,
+        headless=args.headless,
+        decode_workers=args.decode_workers,
+        track_missed_frames=args.track_missed_frames,
+        adaptive=args.adaptive,
+        prefilter=args.prefilter
+    )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
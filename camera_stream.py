@@ -0,0 +1,313 @@
+import csv
+import os
+import threading
+import time
+
+import cv2
+
+
+class FrameGrabber:
+    """
+    Pull frames from a video capture on a background thread.
+
+    Only the most recent frame is kept, so a slow consumer always gets the
+    newest image instead of working through the MJPEG buffer of the IP camera.
+    Frames that are overwritten before anyone reads them count as dropped.
+
+    Frames are decoded into three reused buffers: one being filled, the
+    newest published one and the one the consumer is working on. A frame
+    returned by read() stays valid until the next call to read().
+
+    With a reopen function, a failed read is treated as a dropped
+    connection instead of the end of the stream: the capture is reopened
+    in the background with exponential backoff while read() reports the
+    outage through connected, and frames resume once it is back.
+    """
+
+    def __init__(self, cap, reopen=None, backoff_initial=0.5, backoff_max=10.0):
+        """
+        Args:
+            cap: An opened cv2.VideoCapture (or anything with read/release)
+            reopen: Optional function returning a new capture (or None if it
+                    could not be opened), used to reconnect after a failed read
+            backoff_initial: First reconnect delay in seconds, doubled after every failed attempt
+            backoff_max: Longest reconnect delay in seconds
+        """
+        self.cap = cap
+        self.reopen = reopen
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        # Ask the backend to keep as little as possible buffered on its side
+        try:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except (AttributeError, cv2.error):
+            pass
+
+        # Latest-frame slot
+        self._lock = threading.Condition()
+        self._buffers = [None, None, None]
+        self._published = None  # Buffer index of the newest frame
+        self._held = None  # Buffer index last returned by read()
+        self._frame_time = 0.0
+        self._seq = 0
+        self._read_seq = 0
+        self._running = False
+        self._failed = False
+        self._thread = None
+        self._connected = True
+        self._disconnects = 0
+        self._read_disconnects = 0
+        self._disconnected_since = None
+
+        # Statistics
+        self.frames_grabbed = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self._downtime = 0.0
+
+    def start(self):
+        """Start the capture thread"""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._grab_loop, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _grab_loop(self):
+        while self._running:
+            with self._lock:
+                index = next(i for i in range(3) if i != self._published and i != self._held)
+            ret, frame = self.cap.read(self._buffers[index])
+            now = time.time()
+
+            if not ret and self.reopen is not None:
+                if self._reconnect():
+                    continue
+                break
+
+            with self._lock:
+                if not ret:
+                    self._failed = True
+                    self._running = False
+                    self._lock.notify_all()
+                    break
+
+                # The previous frame was never consumed, it gets dropped
+                if self._seq > self._read_seq:
+                    self.frames_dropped += 1
+
+                self._buffers[index] = frame
+                self._published = index
+                self._frame_time = now
+                self._seq += 1
+                self.frames_grabbed += 1
+                self._lock.notify_all()
+
+    def _reconnect(self):
+        """
+        Reopen the capture with exponential backoff until it works or stop() is called
+
+        Returns:
+            True once reconnected, False if stopped
+        """
+        with self._lock:
+            self._connected = False
+            self._disconnected_since = time.time()
+            self._disconnects += 1
+            self._lock.notify_all()  # Wake read() so the consumer can stop the robot
+        print("Camera stream lost, reconnecting...")
+        self.cap.release()
+
+        delay = self.backoff_initial
+        while self._running:
+            try:
+                cap = self.reopen()
+            except Exception as e:
+                print(f"Warning: Camera reconnect failed: {e}")
+                cap = None
+            if cap is not None and cap.isOpened():
+                self.cap = cap
+                with self._lock:
+                    downtime = time.time() - self._disconnected_since
+                    self._downtime += downtime
+                    self._disconnected_since = None
+                    self._connected = True
+                    self.reconnects += 1
+                print(f"Camera stream reconnected after {downtime:.1f}s")
+                return True
+            if cap is not None:
+                cap.release()
+
+            # Back off, but wake up right away on stop()
+            with self._lock:
+                self._lock.wait_for(lambda: not self._running, timeout=delay)
+            delay = min(delay * 2, self.backoff_max)
+        return False
+
+    def read(self, timeout=None):
+        """
+        Wait for a frame newer than the last one returned.
+
+        Args:
+            timeout: Maximum time to wait in seconds (None waits forever)
+
+        Returns:
+            ret: False if the stream failed, the connection was just lost
+                 (see connected) or the wait timed out
+            frame: The newest frame, or None
+            frame_time: Capture timestamp (time.time()) of that frame, or None
+        """
+        with self._lock:
+            ready = self._lock.wait_for(
+                lambda: (self._seq > self._read_seq or self._failed or not self._running
+                         or self._disconnects > self._read_disconnects),
+                timeout=timeout)
+            self._read_disconnects = self._disconnects
+            if not ready or self._seq <= self._read_seq:
+                return False, None, None
+
+            self._read_seq = self._seq
+            self._held = self._published
+            return True, self._buffers[self._held], self._frame_time
+
+    @property
+    def failed(self):
+        """True once the underlying capture stopped returning frames"""
+        return self._failed
+
+    @property
+    def connected(self):
+        """False while the stream is being reconnected"""
+        return self._connected
+
+    @property
+    def downtime(self):
+        """Total seconds spent disconnected, including the current outage"""
+        with self._lock:
+            downtime = self._downtime
+            if self._disconnected_since is not None:
+                downtime += time.time() - self._disconnected_since
+            return downtime
+
+    def stop(self):
+        """Stop the capture thread and release the capture"""
+        self._running = False
+        with self._lock:
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.cap.release()
+
+
+def open_stream(url, timeout=5.0):
+    """
+    Open a camera stream, giving up after timeout seconds instead of the
+    backend's default (which can be much longer for an unreachable host)
+
+    Returns:
+        The cv2.VideoCapture (check isOpened())
+    """
+    timeout_ms = int(timeout * 1000)
+    try:
+        return cv2.VideoCapture(url, cv2.CAP_ANY, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                                                  cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms])
+    except (TypeError, AttributeError, cv2.error):
+        # OpenCV without open parameters
+        return cv2.VideoCapture(url)
+
+
+def timestamps_path(video_path):
+    """Path of the CSV file holding per-frame capture timestamps for a recording"""
+    return os.path.splitext(video_path)[0] + ".csv"
+
+
+class StreamRecorder:
+    """
+    Save a camera stream to an MJPG video plus a CSV of capture timestamps,
+    so it can be replayed later with ReplayCapture at the original timing.
+    """
+
+    def __init__(self, output_file, frame_size, fps=30.0):
+        """
+        Args:
+            output_file: Output video path (.avi)
+            frame_size: (width, height) of the frames
+            fps: Nominal frame rate stored in the video header
+        """
+        self.output_file = output_file
+        self.writer = cv2.VideoWriter(output_file, cv2.VideoWriter_fourcc(*'MJPG'), fps, frame_size)
+        if not self.writer.isOpened():
+            raise ValueError(f"Could not open {output_file} for writing")
+        self._timestamps = open(timestamps_path(output_file), "w", newline="")
+        self._csv = csv.writer(self._timestamps)
+        self._csv.writerow(["frame", "timestamp"])
+        self.frame_count = 0
+
+    def write(self, frame, timestamp=None):
+        """Append a frame captured at timestamp (default: now)"""
+        self.writer.write(frame)
+        self._csv.writerow([self.frame_count, f"{timestamp or time.time():.6f}"])
+        self.frame_count += 1
+
+    def close(self):
+        self.writer.release()
+        self._timestamps.close()
+
+
+class ReplayCapture:
+    """
+    Drop-in replacement for cv2.VideoCapture that plays back a recording.
+
+    In realtime mode frames are released at their recorded timestamps, so a
+    FrameGrabber drops frames exactly as it would on the live stream. With
+    realtime=False frames are returned as fast as they can be decoded.
+    """
+
+    def __init__(self, video_path, realtime=True):
+        self.video_path = video_path
+        self.realtime = realtime
+        self.cap = cv2.VideoCapture(video_path)
+
+        # Recorded timestamps, or evenly spaced ones from the video frame rate
+        self.timestamps = []
+        ts_file = timestamps_path(video_path)
+        if os.path.exists(ts_file):
+            with open(ts_file, newline="") as f:
+                self.timestamps = [float(row["timestamp"]) for row in csv.DictReader(f)]
+        if not self.timestamps:
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+            count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.timestamps = [i / fps for i in range(count)]
+
+        self._index = 0
+        self._start_time = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        if self.realtime and self._index < len(self.timestamps):
+            if self._start_time is None:
+                self._start_time = time.time()
+            due = self._start_time + self.timestamps[self._index] - self.timestamps[0]
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        ret, frame = self.cap.read(image)
+        if ret:
+            self._index += 1
+        return ret, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        # Buffering options have no meaning for a file
+        return False
+
+    def release(self):
+        self.cap.release()
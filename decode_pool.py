@@ -0,0 +1,236 @@
+import multiprocessing as mp
+import queue
+import signal
+import threading
+import time
+from collections import defaultdict, deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from qr_detectors import create_detector
+from qr_prefilter import detect_regions
+
+
+def _decode_worker(shm_name, slot_size, tasks, results):
+    """
+    Worker process: decode grayscale frames from shared memory slots
+
+    Tasks are (seq, slot, shape, detector_name, roi, regions) tuples, results
+    are (seq, slot, detections, decode_seconds). None stops the worker.
+    """
+    # Ctrl+C reaches the whole process group: let the parent stop us with the None sentinel
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # One process per core already, don't let OpenCV oversubscribe with its own threads
+    cv2.setNumThreads(1)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    detectors = {}
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, shape, detector_name, roi, regions = task
+
+            detector = detectors.get(detector_name)
+            if detector is None:
+                detector = detectors[detector_name] = create_detector(detector_name)
+
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_size)
+            if roi is not None:
+                x0, y0, x1, y1 = roi
+                frame = frame[y0:y1, x0:x1]
+
+            start = time.perf_counter()
+            try:
+                if regions is not None:
+                    detections = detect_regions(detector, frame, regions)
+                else:
+                    detections = detector.detect(frame)
+            except Exception as e:
+                print(f"Decode worker error: {e}")
+                detections = []
+            elapsed = time.perf_counter() - start
+
+            # Release the view before the slot can be reused
+            del frame
+            results.put((seq, slot, detections, elapsed))
+    finally:
+        shm.close()
+
+
+class DecodePool:
+    """
+    Decode frames in parallel on a pool of worker processes.
+
+    Frames are copied into slots of one shared memory block instead of being
+    pickled. Every frame gets a sequence number, and collect() only returns
+    a result newer than the last one it returned, dropping older results that
+    finish late, so parallel decoding never reorders navigation commands.
+
+    Several robots can share one pool from their own threads, each on its
+    own channel: results and ordering are kept per channel, and a channel
+    may only hold its fair share of the slots so a robot with a fast camera
+    can't keep the workers busy while the others wait.
+    """
+
+    def __init__(self, workers, max_frame_size, slots=None, channels=1):
+        """
+        Args:
+            workers: Number of decode processes
+            max_frame_size: Largest grayscale frame in bytes (width * height)
+            slots: Number of frame slots (default: 2 per worker, at least one per channel)
+            channels: Number of users sharing the pool
+        """
+        self.workers = workers
+        self.slot_size = max_frame_size
+        self.num_slots = max(slots or workers * 2, channels)
+        self.channels = channels
+        self.slots_per_channel = self.num_slots // channels
+
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_size * self.num_slots)
+        self._lock = threading.Lock()
+        self._free_slots = deque(range(self.num_slots))
+        self._in_flight = defaultdict(int)
+        self._finished = []
+        self._context = {}
+
+        # spawn avoids forking the capture and serial threads into the workers
+        ctx = mp.get_context('spawn')
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._processes = [
+            ctx.Process(target=_decode_worker, name=f"DecodeWorker-{i}",
+                        args=(self.shm.name, self.slot_size, self._tasks, self._results),
+                        daemon=True)
+            for i in range(workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._next_seq = 0
+        self._last_used_seq = defaultdict(lambda: -1)
+
+        # Statistics, in total and per channel
+        self.frames_submitted = 0
+        self.frames_rejected = 0  # No free slot, every worker busy
+        self.results_dropped = 0  # Finished after a newer result was used
+        self.channel_stats = defaultdict(lambda: {'submitted': 0, 'rejected': 0, 'dropped': 0})
+
+    def _has_room(self, channel):
+        return bool(self._free_slots) and self._in_flight[channel] < self.slots_per_channel
+
+    def submit(self, gray, detector_name, roi=None, context=None, block=False, channel=0, regions=None):
+        """
+        Queue a grayscale frame for decoding
+
+        Args:
+            gray: Single-channel uint8 frame
+            detector_name: Backend the worker should use
+            roi: Optional (x0, y0, x1, y1) crop to decode
+            regions: Optional list of (x0, y0, x1, y1) crops to decode instead of the frame
+            context: Returned unchanged with the result
+            block: Wait for a free slot instead of rejecting the frame
+            channel: Channel of the caller when the pool is shared
+
+        Returns:
+            Sequence number, or None if all slots (or the channel's share of them) are busy
+        """
+        if gray.nbytes > self.slot_size:
+            raise ValueError(f"Frame of {gray.nbytes} bytes does not fit a {self.slot_size} byte slot")
+        while True:
+            with self._lock:
+                if self._has_room(channel):
+                    slot = self._free_slots.popleft()
+                    self._in_flight[channel] += 1
+                    break
+                if not block:
+                    self.frames_rejected += 1
+                    self.channel_stats[channel]['rejected'] += 1
+                    return None
+            self._drain(timeout=0.1)
+
+        # The slot is ours until its result comes back, fill it outside the lock
+        view = np.ndarray(gray.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_size)
+        view[...] = gray
+        del view
+
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._context[seq] = (channel, context)
+            self.frames_submitted += 1
+            self.channel_stats[channel]['submitted'] += 1
+        self._tasks.put((seq, slot, gray.shape, detector_name, roi, regions))
+        return seq
+
+    def discard_pending(self, channel=0):
+        """Drop the results still in flight on a channel, e.g. when a newer frame was handled without the pool"""
+        with self._lock:
+            self._last_used_seq[channel] = self._next_seq - 1
+
+    def _drain(self, timeout=0.0):
+        """Move finished results off the queue and free their slots"""
+        results = []
+        try:
+            result = self._results.get(timeout=timeout) if timeout else self._results.get_nowait()
+            while True:
+                results.append(result)
+                result = self._results.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            for result in results:
+                self._finished.append(result)
+                self._free_slots.append(result[1])
+                self._in_flight[self._context[result[0]][0]] -= 1
+
+    def collect(self, timeout=0.0, channel=0):
+        """
+        Get the newest finished result that is newer than the last one used
+
+        Args:
+            timeout: Seconds to wait for a result if none is ready
+            channel: Only return results submitted on this channel
+
+        Returns:
+            (seq, detections, decode_seconds, context), or None
+        """
+        with self._lock:
+            ready = any(self._context[result[0]][0] == channel for result in self._finished)
+        self._drain(timeout=0.0 if ready else timeout)
+
+        with self._lock:
+            finished = [result for result in self._finished if self._context[result[0]][0] == channel]
+            self._finished = [result for result in self._finished if self._context[result[0]][0] != channel]
+
+            newest = None
+            stats = self.channel_stats[channel]
+            for seq, _, detections, elapsed in sorted(finished, key=lambda result: result[0]):
+                _, context = self._context.pop(seq)
+                if seq <= self._last_used_seq[channel] or newest is not None:
+                    # Older than the last result used, or replaced by a newer one below
+                    self.results_dropped += 1
+                    stats['dropped'] += 1
+                    if seq <= self._last_used_seq[channel]:
+                        continue
+                newest = (seq, detections, elapsed, context)
+
+            if newest is not None:
+                self._last_used_seq[channel] = newest[0]
+        return newest
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from frame_preprocess import FramePreprocessor
+from qr_detectors import available_detectors, create_detector
+from qr_prefilter import QRPrefilter, detect_regions
+from synthetic_qr_dataset import ANNOTATIONS_FILE
+
+
+def _corner_error(detected, truth):
+    """Mean corner distance, over the corner orderings that keep the polygon's shape"""
+    detected = np.asarray(detected, dtype=np.float32)
+    truth = np.asarray(truth, dtype=np.float32)
+    best = None
+    for order in (truth, truth[::-1]):
+        for shift in range(4):
+            error = float(np.linalg.norm(detected - np.roll(order, shift, axis=0), axis=1).mean())
+            best = error if best is None else min(best, error)
+    return best
+
+
+def _match(detections, codes, scale):
+    """
+    Match detections to ground truth codes
+
+    A detection matches a code if its center lies inside the code's polygon.
+
+    Returns:
+        (localized, decoded, corner_errors, false_positives)
+    """
+    localized = decoded = 0
+    corner_errors = []
+    unmatched = list(range(len(detections)))
+    for code in codes:
+        polygon = np.asarray(code['polygon'], dtype=np.float32)
+        for i in unmatched:
+            data, (x, y, w, h), points = detections[i]
+            center = ((x + w / 2) * scale, (y + h / 2) * scale)
+            if cv2.pointPolygonTest(polygon, center, False) < 0:
+                continue
+            unmatched.remove(i)
+            localized += 1
+            if data == code['data']:
+                decoded += 1
+            if points is not None and len(points) == 4:
+                corner_errors.append(_corner_error(np.asarray(points) * scale, polygon))
+            break
+    return localized, decoded, corner_errors, len(unmatched)
+
+
+def evaluate(dataset_dir, detector_names=None, widths=(320, 480, 640, 0), max_images=None, prefilter=False):
+    """
+    Run detectors over a synthetic dataset at several processing widths
+
+    Each image goes through the same preprocessing as the robot's decode
+    path (grayscale, INTER_AREA resize) before the detector runs on it.
+
+    Args:
+        dataset_dir: Directory written by synthetic_qr_dataset.py
+        detector_names: Backends to evaluate (default: all available)
+        widths: Processing widths, 0 for the original resolution
+        max_images: Only use the first N images
+        prefilter: Decode only the QRPrefilter candidate regions, like the robot's --prefilter
+
+    Returns:
+        List of result dicts, one per backend and width
+    """
+    with open(os.path.join(dataset_dir, ANNOTATIONS_FILE)) as f:
+        images = json.load(f)['images'][:max_images]
+
+    detectors = [create_detector(name) for name in (detector_names or available_detectors())]
+    stats = {}
+    for detector in detectors:
+        for width in widths:
+            stats[(detector.name, width)] = {
+                'codes': 0, 'localized': 0, 'decoded': 0, 'false_positives': 0,
+                'corner_errors': [], 'times': [], 'filtered': 0
+            }
+    preprocessors = {}
+    prefilters = {}
+
+    # Load each image once and run every configuration on it
+    for image in images:
+        frame = cv2.imread(os.path.join(dataset_dir, image['file']))
+        if frame is None:
+            print(f"Warning: could not read {image['file']}, skipping")
+            continue
+        frame_height, frame_width = frame.shape[:2]
+
+        for requested in widths:
+            width = requested or frame_width
+            size = (width, int(width * frame_height / frame_width))
+            preprocessor = preprocessors.setdefault(size, FramePreprocessor(*size))
+            scale = frame_width / width
+
+            for detector in detectors:
+                result = stats[(detector.name, requested)]
+                start = time.perf_counter()
+                gray = preprocessor.gray(frame)
+                if prefilter:
+                    regions = prefilters.setdefault(size, QRPrefilter()).candidates(gray)
+                    detections = detect_regions(detector, gray, regions)
+                    result['filtered'] += not regions
+                else:
+                    detections = detector.detect(gray)
+                elapsed = time.perf_counter() - start
+
+                localized, decoded, corner_errors, false_positives = _match(detections, image['codes'], scale)
+                result['codes'] += len(image['codes'])
+                result['localized'] += localized
+                result['decoded'] += decoded
+                result['false_positives'] += false_positives
+                result['corner_errors'].extend(corner_errors)
+                result['times'].append(elapsed)
+
+    results = []
+    for detector in detectors:
+        for width in widths:
+            result = stats[(detector.name, width)]
+            codes = max(1, result['codes'])
+            times = np.array(result['times']) * 1000
+            errors = result['corner_errors']
+            results.append({
+                'detector': detector.name,
+                'width': width or 'original',
+                'images': len(times),
+                'codes': result['codes'],
+                'recall': round((result['decoded'] if detector.decodes else result['localized']) / codes, 4),
+                'localization_recall': round(result['localized'] / codes, 4),
+                'false_positives': result['false_positives'],
+                'frames_filtered': result['filtered'] if prefilter else None,
+                'corner_error_px': round(float(np.mean(errors)), 2) if errors else None,
+                'corner_error_p95_px': round(float(np.percentile(errors, 95)), 2) if errors else None,
+                'ms_per_image': round(float(np.mean(times)), 2) if len(times) else None,
+                'ms_p95': round(float(np.percentile(times, 95)), 2) if len(times) else None,
+                'images_per_sec': round(1000 / float(np.mean(times)), 1) if len(times) else None,
+            })
+    return results
+
+
+def print_results(results):
+    print(f"\n{'Detector':<14}{'Width':>9}{'Recall':>9}{'Located':>9}{'FP':>6}"
+          f"{'Err px':>9}{'ms/img':>9}{'img/s':>8}")
+    for r in results:
+        error = f"{r['corner_error_px']:.1f}" if r['corner_error_px'] is not None else "-"
+        print(f"{r['detector']:<14}{r['width']:>9}{r['recall'] * 100:>8.1f}%"
+              f"{r['localization_recall'] * 100:>8.1f}%{r['false_positives']:>6}"
+              f"{error:>9}{r['ms_per_image']:>9.2f}{r['images_per_sec']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate QR detectors on a synthetic dataset')
+    parser.add_argument('--dataset', type=str, default='qr_dataset',
+                        help='Directory written by synthetic_qr_dataset.py')
+    parser.add_argument('--detectors', type=str, default=None,
+                        help='Comma separated backends (default: all available)')
+    parser.add_argument('--widths', type=str, default='320,480,640,0',
+                        help='Comma separated processing widths, 0 for the original resolution')
+    parser.add_argument('--max-images', type=int, default=None,
+                        help='Only evaluate the first N images')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Decode only the regions the QR prefilter passes')
+    parser.add_argument('--json', type=str, default=None,
+                        help='Write the results to this JSON file')
+
+    args = parser.parse_args()
+
+    results = evaluate(
+        args.dataset,
+        detector_names=args.detectors.split(',') if args.detectors else None,
+        widths=[int(w) for w in args.widths.split(',')],
+        max_images=args.max_images,
+        prefilter=args.prefilter
+    )
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from decode_pool import DecodePool
+from qr_detectors import available_detectors
+from navigation_robot import install_stop_handlers, restore_signal_handlers
+from pyzbar_navigation import DEFAULT_CONFIG, create_robot, resolve_detector
+
+# Settings shared by the whole fleet, every other key is a robot default
+FLEET_SETTINGS = ('decode_workers', 'telemetry_port', 'robots')
+
+
+def load_fleet_config(path):
+    """
+    Read a fleet file: shared settings, robot defaults and a list of robots
+
+    Example:
+        {"decode_workers": 3, "telemetry_port": 8090, "frame_width": 480,
+         "robots": [{"name": "car1", "camera_url": "http://10.0.0.11:8080/video", "port": "/dev/ttyUSB0"},
+                    {"name": "car2", "camera_url": "http://10.0.0.12:8080/video", "port": "/dev/ttyUSB1"}]}
+
+    Returns:
+        (fleet settings, list of robot configs with every DEFAULT_CONFIG key plus 'name')
+    """
+    with open(path) as f:
+        config = json.load(f)
+    defaults = {key: value for key, value in config.items() if key not in FLEET_SETTINGS}
+    fleet = {key: config[key] for key in FLEET_SETTINGS if key in config}
+    robots = [fleet_robot_config(robot, defaults, i) for i, robot in enumerate(fleet.pop('robots', []))]
+    return fleet, robots
+
+
+def fleet_robot_config(robot, defaults=None, index=0):
+    """Complete one robot's settings from the fleet defaults and DEFAULT_CONFIG"""
+    config = {**DEFAULT_CONFIG, **(defaults or {}), **robot}
+    config.setdefault('name', f"robot{index + 1}")
+    unknown = set(config) - set(DEFAULT_CONFIG) - {'name'}
+    if unknown:
+        raise ValueError(f"Unknown settings for {config['name']}: {', '.join(sorted(unknown))}")
+    if not config['camera_url']:
+        raise ValueError(f"{config['name']} has no camera_url")
+    if config['use_async']:
+        print(f"{config['name']}: the supervisor runs every robot on a thread, ignoring use_async")
+    if config['decode_workers']:
+        print(f"{config['name']}: robots decode on the fleet's shared pool, ignoring decode_workers")
+    # One process can't show a window per robot thread
+    config['headless'] = True
+    return config
+
+
+def create_fleet(configs, **options):
+    """
+    Create the robots in parallel, so camera and Arduino connections overlap
+
+    Args:
+        configs: Robot configs from load_fleet_config or fleet_robot_config
+        options: Extra QRNavigationRobot keyword arguments for every robot
+
+    Returns:
+        Dict of name -> QRNavigationRobot, in config order
+    """
+    names = [config['name'] for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("Robot names must be unique")
+
+    # Resolve the detectors here, once: backends import their libraries on
+    # first use, and the robot threads must not race to do that
+    resolved = {}
+    configs = [dict(config) for config in configs]
+    for config in configs:
+        detector = config['detector']
+        if detector not in resolved:
+            try:
+                resolved[detector] = resolve_detector(detector)
+            except ValueError as e:
+                raise ValueError(f"{config['name']}: {e}")
+        config['detector'] = resolved[detector]
+    if "auto" in resolved.values():
+        # Calibration in run() tries every backend
+        available_detectors()
+
+    with ThreadPoolExecutor(max_workers=len(configs) or 1) as executor:
+        futures = [executor.submit(create_robot, config, **options) for config in configs]
+        robots, errors = {}, []
+        for name, future in zip(names, futures):
+            try:
+                robots[name] = future.result()
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+
+    if errors:
+        for robot in robots.values():
+            robot.close()
+        raise ValueError("Could not start the fleet:\n  " + "\n  ".join(errors))
+    return robots
+
+
+class FleetSupervisor:
+    """
+    Drive several robots from one process.
+
+    Every robot keeps its own capture thread, control loop (on its own
+    thread) and serial writer, but they all decode on one DecodePool. Each
+    robot is a channel of the pool, limited to its share of the frame slots,
+    so the workers are split fairly however fast each camera is. One
+    TelemetryServer shows the state of the whole fleet.
+    """
+
+    def __init__(self, robots, decode_workers=None, telemetry_port=None):
+        """
+        Args:
+            robots: Dict of name -> QRNavigationRobot (see create_fleet)
+            decode_workers: Decode processes shared by all robots (default: one per CPU, at least 1)
+            telemetry_port: Serve the fleet state over HTTP on this port
+        """
+        self.robots = robots
+        self.decode_workers = decode_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.running = False
+        self._threads = {}
+
+        # Slots must fit the largest frame any robot could ask to decode
+        max_frame_size = max(max(robot.resize_width * robot.resize_height, robot.frame_width * robot.frame_height)
+                             for robot in robots.values())
+        self.decode_pool = DecodePool(self.decode_workers, max_frame_size,
+                                      slots=max(2 * self.decode_workers, len(robots)), channels=len(robots))
+        self.channels = {}
+        for channel, (name, robot) in enumerate(robots.items()):
+            robot.use_shared_decode_pool(self.decode_pool, channel)
+            self.channels[name] = channel
+        print(f"Decoding for {len(robots)} robot(s) on {self.decode_workers} shared worker process(es), "
+              f"{self.decode_pool.slots_per_channel} frame slot(s) each")
+
+        self.telemetry_server = None
+        if telemetry_port:
+            from telemetry_server import TelemetryServer
+            self.telemetry_server = TelemetryServer(self.status_snapshot, port=telemetry_port,
+                                                    stream_fps=0).start()
+
+    def run(self):
+        """Run every robot until all of them stop or SIGINT/SIGTERM arrives"""
+        self.running = True
+        previous_handlers = install_stop_handlers(self.stop, "stopping the fleet...")
+        for name, robot in self.robots.items():
+            thread = threading.Thread(target=self._run_robot, args=(name, robot), name=f"Robot-{name}")
+            self._threads[name] = thread
+            thread.start()
+
+        try:
+            # Join with a timeout so the main thread keeps handling signals
+            while any(thread.is_alive() for thread in self._threads.values()):
+                if not self.running:
+                    for robot in self.robots.values():
+                        robot.running = False
+                for thread in self._threads.values():
+                    thread.join(timeout=0.2)
+        finally:
+            restore_signal_handlers(previous_handlers)
+            self.close()
+
+    def _run_robot(self, name, robot):
+        try:
+            robot.run()
+        except Exception as e:
+            # One failing robot must not take the rest of the fleet down
+            print(f"{name}: stopped with error: {e}")
+            robot.close()
+        else:
+            print(f"{name}: stopped")
+
+    def status_snapshot(self):
+        """State of every robot and of the shared decode pool as a JSON-serializable dict"""
+        pool = self.decode_pool
+        return {
+            'time': time.time(),
+            'robots': {name: {**robot.status_snapshot(),
+                              'running': name in self._threads and self._threads[name].is_alive()}
+                       for name, robot in self.robots.items()},
+            'decode_pool': {
+                'workers': self.decode_workers,
+                'slots_per_robot': pool.slots_per_channel,
+                'robots': {name: dict(pool.channel_stats[channel]) for name, channel in self.channels.items()},
+            },
+        }
+
+    def stop(self):
+        """Make run() stop every robot and return"""
+        self.running = False
+
+    def close(self):
+        """Stop the telemetry server and the shared decode pool (robots close themselves)"""
+        if self.telemetry_server is not None:
+            self.telemetry_server.stop()
+            self.telemetry_server = None
+        if self.decode_pool is not None:
+            pool = self.decode_pool
+            for name, channel in self.channels.items():
+                stats = pool.channel_stats[channel]
+                print(f"Decode pool, {name}: {stats['submitted']} submitted, "
+                      f"{stats['rejected']} rejected (share busy), {stats['dropped']} stale results dropped")
+            pool.close()
+            self.decode_pool = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive several QR navigation robots from one process')
+    parser.add_argument('--config', type=str, default=None,
+                        help='JSON fleet file (see load_fleet_config)')
+    parser.add_argument('--robot', nargs=2, action='append', default=[], metavar=('CAMERA_URL', 'PORT'),
+                        help='Add a robot with this camera URL and Arduino serial port (repeatable)')
+    parser.add_argument('--decode-workers', type=int, default=None,
+                        help='Shared decode processes (default: one per CPU, at least 1)')
+    parser.add_argument('--telemetry-port', type=int, default=None,
+                        help='Serve the fleet state over HTTP on this port')
+    args = parser.parse_args()
+
+    try:
+        fleet, configs = load_fleet_config(args.config) if args.config else ({}, [])
+        for camera_url, port in args.robot:
+            configs.append(fleet_robot_config({'camera_url': camera_url, 'port': port}, index=len(configs)))
+        if not configs:
+            parser.error("no robots given (--config or --robot)")
+        robots = create_fleet(configs)
+    except ValueError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+    supervisor = FleetSupervisor(
+        robots,
+        decode_workers=args.decode_workers or fleet.get('decode_workers'),
+        telemetry_port=args.telemetry_port or fleet.get('telemetry_port')
+    )
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+
+def reuse_buffer(buffers, name, shape):
+    """
+    Reuse the named uint8 buffer of a dict if it has the right shape, otherwise allocate a new one
+
+    Args:
+        buffers: Dict of name -> buffer, updated in place
+        name: Key of the buffer
+        shape: Shape the buffer must have
+
+    Returns:
+        The buffer, to be written with dst=
+    """
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape:
+        buffer = buffers[name] = np.empty(shape, dtype=np.uint8)
+    return buffer
+
+
+class FramePreprocessor:
+    """
+    Convert camera frames for detection and display into preallocated buffers.
+
+    Frames are converted to grayscale at full resolution and then shrunk
+    with INTER_AREA on the single channel, writing through dst= into buffers
+    that are reused from frame to frame. In steady state nothing is
+    allocated per frame. Returned arrays are overwritten by the next call,
+    so copy them if they need to outlive the current frame.
+    """
+
+    def __init__(self, width, height):
+        """
+        Args:
+            width, height: Processing resolution
+        """
+        self.size = (width, height)
+        self._buffers = {}
+
+    def set_size(self, width, height):
+        """Change the processing resolution (buffers are reallocated on next use)"""
+        self.size = (width, height)
+
+    def gray(self, frame):
+        """
+        Grayscale frame at the processing resolution
+
+        Returns:
+            Contiguous uint8 array of shape (height, width)
+        """
+        width, height = self.size
+        full_gray = reuse_buffer(self._buffers, 'full_gray', frame.shape[:2])
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=full_gray)
+
+        if frame.shape[1] == width and frame.shape[0] == height:
+            return full_gray
+
+        small_gray = reuse_buffer(self._buffers, 'small_gray', (height, width))
+        cv2.resize(full_gray, (width, height), dst=small_gray, interpolation=cv2.INTER_AREA)
+        return small_gray
+
+    def color(self, frame):
+        """Color frame at the processing resolution, for annotation and display"""
+        width, height = self.size
+        small_color = reuse_buffer(self._buffers, 'small_color', (height, width, 3))
+        cv2.resize(frame, (width, height), dst=small_color, interpolation=cv2.INTER_AREA)
+        return small_color
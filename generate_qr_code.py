@@ -1,24 +1,46 @@
 import qrcode
 import os
+import re
+import csv
+import sys
 import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
 
-def generate_qr_code(data, output_file, size=10, border=4, add_text=True):
+# Font of the current batch worker process, loaded once by _init_worker
+_worker_font = None
+_worker_options = {}
+
+def load_font(size=20):
+    """Load the label font, falling back to PIL's default font"""
+    try:
+        # Try to use a TrueType font if available
+        return ImageFont.truetype("arial.ttf", size)
+    except IOError:
+        # Fall back to default font
+        return ImageFont.load_default()
+
+def render_qr_code(data, size=10, border=4, add_text=True, font=None, box_size=10, max_pixels=None):
     """
-    Generate a QR code with optional text label
+    Render a QR code with optional text label to a PIL image
     
     Args:
         data: The data to encode in the QR code
-        output_file: Output file path (PNG)
         size: QR code size (1-40, higher means more data capacity)
         border: Border size in modules
         add_text: Whether to add text label below QR code
+        font: Label font (loaded with load_font if not given)
+        box_size: Size of each box in pixels
+        max_pixels: If set, pick the box size so the code is at most this wide
+    
+    Returns:
+        PIL image, mode '1' without a label and 'L' with one
     """
     # Create QR code instance
     qr = qrcode.QRCode(
         version=size,
         error_correction=qrcode.constants.ERROR_CORRECT_H,  # High error correction
-        box_size=10,  # Size of each box in pixels
         border=border  # Border size in boxes
     )
     
@@ -26,39 +48,51 @@ def generate_qr_code(data, output_file, size=10, border=4, add_text=True):
     qr.add_data(data)
     qr.make(fit=True)
     
-    # Create an image from the QR Code
-    img = qr.make_image(fill_color="black", back_color="white")
+    # Scale the module matrix (border included) up to boxes in one go instead
+    # of drawing every box separately
+    modules = np.array(qr.get_matrix(), dtype=bool)
+    if max_pixels is not None:
+        box_size = max(1, max_pixels // len(modules))
+    pixels = np.repeat(np.repeat(~modules, box_size, axis=0), box_size, axis=1)
+    img = Image.fromarray(pixels)
     
     # Add text label if requested
     if add_text:
-        # Convert to PIL image with mode 'RGB'
-        img = img.convert('RGB')
+        if font is None:
+            font = load_font()
         
         # Get image size
         img_width, img_height = img.size
         
         # Create a new image with extra space for text
-        text_height = 30
-        new_img = Image.new('RGB', (img_width, img_height + text_height), color='white')
+        text_height = int(getattr(font, 'size', 20) * 1.5)
+        new_img = Image.new('L', (img_width, img_height + text_height), color=255)
         new_img.paste(img, (0, 0))
         
-        # Add text
-        draw = ImageDraw.Draw(new_img)
-        try:
-            # Try to use a TrueType font if available
-            font = ImageFont.truetype("arial.ttf", 20)
-        except IOError:
-            # Fall back to default font
-            font = ImageFont.load_default()
-        
         # Center text below QR code
-        text_width = len(data) * 10  # Approximate width based on text length
-        text_x = (img_width - text_width) // 2
-        text_y = img_height + 5
+        draw = ImageDraw.Draw(new_img)
+        text_width = draw.textlength(data, font=font)
+        text_x = max(0, int((img_width - text_width) // 2))
+        text_y = img_height + text_height // 6
         
-        draw.text((text_x, text_y), data, fill="black", font=font)
+        draw.text((text_x, text_y), data, fill=0, font=font)
         img = new_img
     
+    return img
+
+def generate_qr_code(data, output_file, size=10, border=4, add_text=True):
+    """
+    Generate a QR code with optional text label
+    
+    Args:
+        data: The data to encode in the QR code
+        output_file: Output file path (PNG)
+        size: QR code size (1-40, higher means more data capacity)
+        border: Border size in modules
+        add_text: Whether to add text label below QR code
+    """
+    img = render_qr_code(data, size=size, border=border, add_text=add_text)
+    
     # Save the image
     img.save(output_file)
     print(f"QR code saved to {output_file}")
@@ -69,6 +103,132 @@ def generate_qr_code(data, output_file, size=10, border=4, add_text=True):
     
     return output_file
 
+def read_payloads(source):
+    """
+    Read QR payloads from the first column of a CSV file
+    
+    Args:
+        source: CSV file path, or '-' for stdin. Empty rows and rows starting
+                with # are skipped, as is a header row named 'data' or 'payload'.
+    
+    Returns:
+        List of payloads in file order
+    """
+    if source == '-':
+        rows = list(csv.reader(sys.stdin))
+    else:
+        with open(source, newline='') as f:
+            rows = list(csv.reader(f))
+    
+    payloads = [row[0].strip() for row in rows if row and row[0].strip()]
+    payloads = [payload for payload in payloads if not payload.startswith('#')]
+    if payloads and payloads[0].lower() in ('data', 'payload'):
+        payloads = payloads[1:]
+    return payloads
+
+def _init_worker(size, border, add_text, font_size):
+    """Batch worker setup: load the label font once instead of once per code"""
+    global _worker_font, _worker_options
+    _worker_font = load_font(font_size) if add_text else None
+    _worker_options = {'size': size, 'border': border, 'add_text': add_text}
+
+def _save_worker(task):
+    data, output_file = task
+    render_qr_code(data, font=_worker_font, **_worker_options).save(output_file)
+    return output_file
+
+def _page_worker(task):
+    """Render one sheet page: a grid of codes, each fitted to its cell"""
+    payloads, page_size, columns, rows, margin = task
+    page_width, page_height = page_size
+    cell_width = (page_width - 2 * margin) // columns
+    cell_height = (page_height - 2 * margin) // rows
+    label_height = int(getattr(_worker_font, 'size', 0) * 1.5) if _worker_options['add_text'] else 0
+    max_pixels = min(cell_width, cell_height - label_height) - margin
+    
+    page = Image.new('L', page_size, color=255)
+    for i, data in enumerate(payloads):
+        img = render_qr_code(data, font=_worker_font, max_pixels=max_pixels, **_worker_options)
+        x = margin + (i % columns) * cell_width + (cell_width - img.size[0]) // 2
+        y = margin + (i // columns) * cell_height + (cell_height - img.size[1]) // 2
+        page.paste(img, (x, y))
+    return page
+
+def _safe_filename(data):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', data)[:50] or 'qr'
+
+def generate_batch(payloads, output_dir, size=5, border=4, add_text=True, workers=None, font_size=20):
+    """
+    Generate one PNG per payload on a pool of worker processes
+    
+    Args:
+        payloads: Data to encode, one QR code each
+        output_dir: Directory for the PNG files (created if needed)
+        size, border, add_text: As for generate_qr_code
+        workers: Number of processes (default: one per CPU)
+        font_size: Label font size
+    
+    Returns:
+        List of the written file paths, in payload order
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(data, os.path.join(output_dir, f"{i + 1:04d}_{_safe_filename(data)}.png"))
+             for i, data in enumerate(payloads)]
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(size, border, add_text, font_size)) as pool:
+        files = list(pool.map(_save_worker, tasks, chunksize=max(1, len(tasks) // 64)))
+    
+    print(f"{len(files)} QR codes saved to {output_dir}")
+    return files
+
+def generate_sheets(payloads, output_file, size=5, border=4, add_text=True, workers=None,
+                    columns=3, rows=4, dpi=300, font_size=40):
+    """
+    Tile QR codes into printable A4 pages, rendered in parallel page by page
+    
+    Args:
+        payloads: Data to encode, one QR code each
+        output_file: A .pdf file gets every page; for any other extension
+                     each page is saved as <name>_<page><ext>
+        size, border, add_text: As for generate_qr_code
+        workers: Number of processes (default: one per CPU)
+        columns, rows: Grid of codes on each page
+        dpi: Print resolution of the pages
+        font_size: Label font size in pixels
+    
+    Returns:
+        List of the written file paths
+    """
+    # A4 is 210 x 297 mm
+    page_size = (int(8.27 * dpi), int(11.69 * dpi))
+    margin = dpi // 4
+    per_page = columns * rows
+    tasks = [(payloads[i:i + per_page], page_size, columns, rows, margin)
+             for i in range(0, len(payloads), per_page)]
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(size, border, add_text, font_size)) as pool:
+        pages = list(pool.map(_page_worker, tasks))
+    
+    if not pages:
+        print("No payloads, nothing to write")
+        return []
+    
+    root, ext = os.path.splitext(output_file)
+    if ext.lower() == '.pdf':
+        pages[0].save(output_file, save_all=True, append_images=pages[1:], resolution=dpi)
+        files = [output_file]
+    else:
+        files = []
+        for i, page in enumerate(pages):
+            page_file = f"{root}_{i + 1}{ext or '.png'}"
+            page.save(page_file, dpi=(dpi, dpi))
+            files.append(page_file)
+    
+    print(f"{len(payloads)} QR codes on {len(pages)} page(s) saved to {', '.join(files)}")
+    return files
+
 def main():
     parser = argparse.ArgumentParser(description='Generate QR code for robot tracking')
     parser.add_argument('--data', type=str, default='ROBOT_TARGET', 
@@ -81,16 +241,41 @@ def main():
                         help='Border size in modules')
     parser.add_argument('--no-text', action='store_true',
                         help='Do not add text label below QR code')
+    parser.add_argument('--batch', type=str, default=None,
+                        help='CSV file with one payload per row (first column), or - for stdin')
+    parser.add_argument('--output-dir', type=str, default='qr_codes',
+                        help='Directory for the batch PNG files')
+    parser.add_argument('--sheet', type=str, default=None,
+                        help='Tile the batch into printable A4 pages (.pdf, or .png for one file per page)')
+    parser.add_argument('--columns', type=int, default=3,
+                        help='Codes per row on a sheet')
+    parser.add_argument('--rows', type=int, default=4,
+                        help='Rows of codes on a sheet')
+    parser.add_argument('--dpi', type=int, default=300,
+                        help='Sheet print resolution')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for batch mode (default: one per CPU)')
     
     args = parser.parse_args()
     
-    generate_qr_code(
-        data=args.data,
-        output_file=args.output,
-        size=args.size,
-        border=args.border,
-        add_text=not args.no_text
-    )
+    if args.batch is None:
+        generate_qr_code(
+            data=args.data,
+            output_file=args.output,
+            size=args.size,
+            border=args.border,
+            add_text=not args.no_text
+        )
+        return
+    
+    payloads = read_payloads(args.batch)
+    if args.sheet:
+        generate_sheets(payloads, args.sheet, size=args.size, border=args.border,
+                        add_text=not args.no_text, workers=args.workers,
+                        columns=args.columns, rows=args.rows, dpi=args.dpi)
+    else:
+        generate_batch(payloads, args.output_dir, size=args.size, border=args.border,
+                       add_text=not args.no_text, workers=args.workers)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
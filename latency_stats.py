@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class LatencyTracker:
+    """
+    Per-stage latency measurements kept in fixed-size ring buffers.
+
+    Stages are identified by name. Each one keeps its last `size` durations,
+    summarized as p50/p95/p99. When tracing is enabled every measurement is
+    also kept as a Chrome trace event (chrome://tracing or ui.perfetto.dev).
+    """
+
+    def __init__(self, size=512, trace=False, trace_size=100000):
+        """
+        Args:
+            size: Number of samples kept per stage (None keeps all of them)
+            trace: Keep trace events for dump_trace()
+            trace_size: Maximum number of trace events kept
+        """
+        self.size = size
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._trace = deque(maxlen=trace_size) if trace else None
+        self._pid = os.getpid()
+
+    @contextmanager
+    def measure(self, stage):
+        """Time the body of a with-block as one sample of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, duration, end=None):
+        """
+        Add one sample
+
+        Args:
+            stage: Stage name
+            duration: Duration in seconds
+            end: time.perf_counter() value at the end of the interval (default: now)
+        """
+        with self._lock:
+            buffer = self._buffers.get(stage)
+            if buffer is None:
+                buffer = self._buffers[stage] = deque(maxlen=self.size)
+            buffer.append(duration)
+
+            if self._trace is not None:
+                if end is None:
+                    end = time.perf_counter()
+                self._trace.append({
+                    'name': stage,
+                    'ph': 'X',
+                    'ts': (end - duration) * 1e6,
+                    'dur': duration * 1e6,
+                    'pid': self._pid,
+                    'tid': threading.get_ident(),
+                })
+
+    def summary(self):
+        """Dict of stage -> count/mean/p50/p95/p99 in milliseconds"""
+        with self._lock:
+            buffers = {stage: list(buffer) for stage, buffer in self._buffers.items()}
+
+        result = {}
+        for stage, samples in buffers.items():
+            ms = np.asarray(samples) * 1000
+            result[stage] = {
+                'count': len(samples),
+                'mean': round(float(ms.mean()), 3),
+                'p50': round(float(np.percentile(ms, 50)), 3),
+                'p95': round(float(np.percentile(ms, 95)), 3),
+                'p99': round(float(np.percentile(ms, 99)), 3),
+            }
+        return result
+
+    def print_summary(self):
+        """Print the latency summary as a table"""
+        summary = self.summary()
+        if not summary:
+            return
+        print("\nLatency (ms)            p50      p95      p99   samples")
+        for stage, stats in summary.items():
+            print(f"  {stage:<18}{stats['p50']:9.2f}{stats['p95']:9.2f}{stats['p99']:9.2f}"
+                  f"{stats['count']:10d}")
+
+    def dump_trace(self, output_file):
+        """Write the recorded trace events as a Chrome trace JSON file"""
+        if self._trace is None:
+            raise ValueError("Tracing was not enabled for this LatencyTracker")
+        with self._lock:
+            events = list(self._trace)
+        with open(output_file, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        print(f"Trace with {len(events)} events saved to {output_file}")
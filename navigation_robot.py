@@ -0,0 +1,1005 @@
+import os
+import signal
+import threading
+import time
+
+import cv2
+import numpy as np
+import serial
+
+from adaptive_control import AdaptiveController
+from camera_stream import FrameGrabber, open_stream
+from frame_preprocess import FramePreprocessor
+from latency_stats import LatencyTracker
+from serial_writer import SerialCommandWriter, describe_command, encode_motor_command, wait_for_ready
+from steering import SteeringController
+from target_tracker import TargetTracker
+from route import Route
+from qr_detectors import DetectOnlyDetector, create_detector, select_fastest_detector
+from qr_prefilter import QRPrefilter, detect_regions
+
+def install_stop_handlers(stop, message="stopping..."):
+    """
+    Make SIGINT/SIGTERM call stop() instead of killing the process
+    
+    Signal handlers can only be set from the main thread, elsewhere nothing is installed.
+    
+    Args:
+        stop: Function called when a signal arrives
+        message: Printed after the signal number
+    
+    Returns:
+        Previous handlers, for restore_signal_handlers()
+    """
+    previous = {}
+    if threading.current_thread() is not threading.main_thread():
+        return previous
+    
+    def handle_stop(signum, _frame):
+        print(f"\nReceived signal {signum}, {message}")
+        stop()
+    
+    for sig in (signal.SIGINT, getattr(signal, 'SIGTERM', None)):
+        if sig is not None:
+            previous[sig] = signal.signal(sig, handle_stop)
+    return previous
+
+def restore_signal_handlers(previous):
+    """Put back the handlers replaced by install_stop_handlers()"""
+    for sig, handler in previous.items():
+        signal.signal(sig, handler)
+
+class QRNavigationRobot:
+    def __init__(self, camera_url, arduino_port, baud_rate=9600, resize_width=640, skip_frames=1,
+                 roi_tracking=True, roi_padding=0.5, roi_max_misses=3, full_scan_interval=15,
+                 detector="pyzbar", calibration_frames=10, target_payload=None, verify_interval=30,
+                 capture=None, serial_port=None, trace_file=None,
+                 headless=False, preview_file=None, preview_interval=30, decode_workers=0,
+                 steering="pid", max_speed=70, track_missed_frames=5,
+                 adaptive=False, latency_budget=0.05,
+                 route=None, arrive_area=0.15, search_speed=30, search_timeout=10.0,
+                 telemetry_port=None, reconnect=True, prefilter=False):
+        # QR detection backend ('auto' picks the fastest one on live frames in run()),
+        # checked before the Arduino port is opened since opening it resets the board
+        self.calibration_frames = calibration_frames
+        if detector == "auto":
+            self.detector = None
+        else:
+            self.detector = create_detector(detector)
+            print(f"Using QR detector: {self.detector.name}")
+        
+        # Route mode: drive to each waypoint payload in turn
+        self.route = Route(route, arrive_area=arrive_area) if route else None
+        self.search_speed = search_speed  # Turn speed while looking for the next waypoint
+        self.search_timeout = search_timeout  # Stop after searching this many seconds
+        self.search_start = None
+        if self.route is not None:
+            if self.detector is not None and not self.detector.decodes:
+                raise ValueError(f"Route mode needs a decoding QR detector, not '{self.detector.name}'")
+            if target_payload is not None:
+                print("Route mode decodes every frame, ignoring the target payload")
+                target_payload = None
+            print(f"Following a route of {len(self.route.waypoints)} waypoints: "
+                  f"{' -> '.join(self.route.waypoints)}")
+        
+        # Connect to the Arduino in the background while the camera stream opens
+        arduino_connection = {}
+        arduino_thread = None
+        if serial_port is None:
+            arduino_thread = threading.Thread(
+                target=lambda: arduino_connection.update(port=self._connect_arduino(arduino_port, baud_rate)),
+                name="ArduinoConnect", daemon=True)
+            arduino_thread.start()
+        
+        # Connect to camera (or use a provided capture, e.g. a ReplayCapture)
+        self.cap = None
+        try:
+            print(f"\nConnecting to camera at {camera_url}...")
+            self.cap = capture if capture is not None else open_stream(camera_url)
+            if not self.cap.isOpened():
+                raise ValueError(f"Could not open video stream from {camera_url}")
+            
+            # Grab frames on a background thread so we always process the newest one,
+            # reconnecting to the camera if the stream drops
+            reopen = None
+            if capture is None and reconnect:
+                reopen = lambda: open_stream(camera_url)
+            self.grabber = FrameGrabber(self.cap, reopen=reopen)
+            self.stream_lost = False
+            
+            # Performance optimizations
+            self.resize_width = resize_width
+            self.skip_frames = max(1, skip_frames)
+            self.frame_count = 0
+            
+            # Get frame dimensions
+            self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            self.aspect_ratio = self.frame_height / self.frame_width
+            self.resize_height = int(self.resize_width * self.aspect_ratio)
+            
+            print(f"Original camera resolution: {self.frame_width}x{self.frame_height}")
+            print(f"Processing at resolution: {self.resize_width}x{self.resize_height}")
+            print(f"Processing every {self.skip_frames} frame(s)")
+        except BaseException:
+            # Don't leave the port open or the camera held when startup fails
+            if arduino_thread is not None:
+                arduino_thread.join()
+                if arduino_connection.get('port'):
+                    arduino_connection['port'].close()
+            if self.cap is not None:
+                self.cap.release()
+            raise
+        
+        # Arduino connection (or a provided port, e.g. a FakeSerial)
+        if serial_port is not None:
+            self.arduino = serial_port
+        else:
+            arduino_thread.join()
+            self.arduino = arduino_connection.get('port')
+        
+        # Fast path: once the target payload is confirmed, only localize the code
+        # and fully decode again every verify_interval frames to re-verify it.
+        # Localized codes have no payload, so the one closest to the target's
+        # last position is taken, and a frame with several candidates (or none
+        # near it) is decoded in full instead.
+        self.target_payload = target_payload
+        self.verify_interval = max(1, verify_interval)
+        self.target_confirmed = False
+        self.target_ambiguous = False
+        self.frames_since_verify = 0
+        self.localizer = None
+        if self.target_payload is not None:
+            if DetectOnlyDetector.is_available():
+                self.localizer = DetectOnlyDetector()
+                print(f"Fast tracking enabled for '{self.target_payload}' "
+                      f"(re-verify every {self.verify_interval} frames)")
+            else:
+                print("Warning: OpenCV QR localization not available, decoding every frame")
+        
+        # Adaptive controller for resize_width and skip_frames
+        self.adaptive = None
+        if adaptive:
+            self.adaptive = AdaptiveController(self.resize_width, max_width=self.frame_width,
+                                               latency_budget=latency_budget)
+            self.skip_frames = self.adaptive.skip_frames
+            print(f"Adaptive resolution and decode rate enabled "
+                  f"(latency budget {latency_budget * 1000:.0f} ms)")
+        self.last_decode_time = 0.0
+        
+        # Reused buffers for grayscale conversion, resizing and display
+        self.preprocessor = FramePreprocessor(self.resize_width, self.resize_height)
+        
+        # Cheap check before full-frame scans: skip frames with no QR-like
+        # region and decode only the candidate regions of the others
+        self.prefilter = QRPrefilter() if prefilter else None
+        if self.prefilter is not None:
+            print("QR prefilter enabled (frames without QR-like regions are not decoded)")
+        
+        # Optional pool of decode processes (started on first use, after calibration)
+        self.decode_workers = max(0, decode_workers)
+        self.decode_pool = None
+        self.decode_channel = 0
+        self.owns_decode_pool = True
+        self.last_detections = []
+        if self.decode_workers:
+            print(f"Decoding on {self.decode_workers} worker process(es)")
+        
+        # ROI tracking: decode only around the last known QR location
+        self.roi_tracking = roi_tracking
+        self.roi_padding = roi_padding  # Fraction of the QR size added on each side
+        self.roi_max_misses = max(1, roi_max_misses)  # Misses before a full-frame scan
+        self.full_scan_interval = max(1, full_scan_interval)  # Forced full scan every N decodes
+        self.last_qr_rect = None
+        self.roi_misses = 0
+        self.decodes_since_full_scan = 0
+        if self.roi_tracking:
+            print(f"ROI tracking enabled (full scan every {self.full_scan_interval} decodes "
+                  f"or after {self.roi_max_misses} misses)")
+        
+        # Per-stage latency (optionally exported as a Chrome trace on close)
+        self.trace_file = trace_file
+        self.latency = LatencyTracker(trace=trace_file is not None)
+        
+        # Write commands from a separate thread so the vision loop never blocks on serial
+        self.serial_writer = SerialCommandWriter(self.arduino, latency=self.latency) if self.arduino else None
+        
+        # Navigation parameters
+        self.frame_center_x = self.resize_width // 2
+        self.center_threshold = int(self.resize_width * 0.1)  # 10% of frame width
+        
+        # Steering: 'pid' sends variable left/right motor speeds, 'bang' sends F/L/R
+        self.steering_mode = steering
+        self.steering = SteeringController(max_speed=max_speed) if steering == "pid" else None
+        
+        # Motion tracker bridging skipped frames and up to track_missed_frames missed decodes
+        self.tracker = TargetTracker(max_missed=track_missed_frames) if track_missed_frames > 0 else None
+        
+        # Control parameters
+        self.last_command = None
+        self.command_history = []
+        self.qr_data = None  # Store the most recent QR code data
+        
+        # Performance tracking
+        self.last_frame_time = time.time()
+        self.fps = 0
+        self.processed_count = 0
+        self.processed_fps = 0
+        self.frame_time = None  # Capture time of the frame being processed
+        self.last_status = "Waiting for first decode"
+        self.last_tracked_object = None
+        
+        # Display: headless mode skips all drawing and GUI work, optionally
+        # writing an annotated preview image every preview_interval frames
+        self.headless = headless
+        self.preview_file = preview_file
+        self.preview_interval = preview_interval
+        self.preview_counter = 0
+        self.running = False
+        
+        # Optional HTTP/WebSocket telemetry with an MJPEG stream of the annotated frames
+        self.telemetry_server = None
+        if telemetry_port:
+            from telemetry_server import TelemetryServer
+            self.telemetry_server = TelemetryServer(self.status_snapshot, port=telemetry_port).start()
+        
+        # Display controls
+        if self.headless:
+            print("\nRunning headless, press Ctrl+C to quit")
+            if self.preview_file:
+                print(f"Writing preview to {self.preview_file} every {self.preview_interval} frames")
+        else:
+            print("\nPress 'q' to quit")
+        
+    def _connect_arduino(self, arduino_port, baud_rate, ready_timeout=3.0):
+        """Open the serial port, or return None to run in simulation mode"""
+        try:
+            print(f"Connecting to Arduino on {arduino_port}...")
+            arduino = serial.Serial(arduino_port, baud_rate, timeout=1)
+            # Opening the port resets the board, wait until its sketch is running
+            start = time.time()
+            if wait_for_ready(arduino, ready_timeout):
+                print(f"Connected to Arduino on {arduino_port} (ready after {time.time() - start:.2f}s)")
+            else:
+                print(f"Connected to Arduino on {arduino_port}, no ready message after {ready_timeout:.0f}s")
+            return arduino
+        except Exception as e:
+            print(f"Warning: Could not connect to Arduino: {e}")
+            print("Running in simulation mode (no Arduino control)")
+            return None
+    
+    def decode_gray(self, gray):
+        """
+        Detect QR codes in a grayscale frame at the processing resolution
+        
+        Returns:
+            objects: List of QR codes as (x, y, w, h) tuples
+        """
+        start = time.perf_counter()
+        decoded_objects = self._scan(gray)
+        self.last_decode_time = time.perf_counter() - start
+        self.latency.record('decode', self.last_decode_time)
+        
+        return self._handle_detections(decoded_objects)
+    
+    def decode_gray_pooled(self, gray, block=False):
+        """
+        Detect QR codes in a grayscale frame on the decode worker pool
+        
+        The frame is queued for decoding and the newest result that finished
+        since the last call is used. Results are never older than the last
+        one used, so commands are not reordered.
+        
+        Args:
+            gray: Grayscale frame at the processing resolution
+            block: Wait for a free worker instead of skipping the frame
+            
+        Returns:
+            objects: List of QR codes as (x, y, w, h) tuples, or None if no
+                     newer result is ready yet
+        """
+        if self.decode_pool is None:
+            self._start_decode_pool()
+        
+        # The ROI and backend are planned now, tracking state is updated when the result arrives
+        detector = self._active_detector()
+        roi = self._tracking_roi(gray.shape)
+        regions = None
+        if roi is None and self.prefilter is not None:
+            regions = self.prefilter.candidates(gray)
+            if not regions:
+                # Nothing to decode: this frame's empty result replaces any older one in flight
+                self.decode_pool.discard_pending(self.decode_channel)
+                return self._handle_detections(self._finish_scan(detector, None, []))
+        context = (detector, roi, self.frame_time, self.resize_width)
+        self.decode_pool.submit(gray, detector.name, roi, context=context, block=block,
+                                channel=self.decode_channel, regions=regions)
+        
+        result = self.decode_pool.collect(channel=self.decode_channel)
+        if result is None:
+            return None
+        
+        _, decoded_objects, decode_time, (detector, roi, frame_time, width) = result
+        self.latency.record('decode', decode_time)
+        self.last_decode_time = decode_time
+        if width != self.resize_width:
+            # Decoded before the processing resolution changed
+            return None
+        
+        # Commands are computed from the frame this result belongs to
+        self.frame_time = frame_time
+        decoded_objects = self._finish_scan(detector, roi, decoded_objects)
+        return self._handle_detections(decoded_objects)
+    
+    def _start_decode_pool(self):
+        # Slots must fit the largest frame we could be asked to decode
+        max_frame_size = max(self.resize_width * self.resize_height, self.frame_width * self.frame_height)
+        from decode_pool import DecodePool  # multiprocessing is only needed with workers
+        self.decode_pool = DecodePool(self.decode_workers, max_frame_size)
+        print(f"Started decode pool with {self.decode_workers} worker process(es)")
+    
+    def use_shared_decode_pool(self, pool, channel):
+        """
+        Decode on a pool shared with other robots instead of starting one
+        
+        Args:
+            pool: DecodePool created with at least channel + 1 channels
+            channel: This robot's channel on the pool (close() leaves the pool running)
+        """
+        self.decode_pool = pool
+        self.decode_channel = channel
+        self.decode_workers = pool.workers
+        self.owns_decode_pool = False
+    
+    def _handle_detections(self, decoded_objects):
+        """Store QR data and the detections for drawing, and build the object list"""
+        self.last_detections = decoded_objects
+        
+        # List to store QR code locations
+        objects = []
+        
+        for data, (x, y, w, h), points in decoded_objects:
+            # Store QR code data (detect-only backends do not decode)
+            if data is not None:
+                self.qr_data = data
+            
+            # Add to objects list
+            objects.append((x, y, w, h))
+        
+        if self.route is not None:
+            objects = self._route_objects(decoded_objects)
+        
+        return objects
+    
+    def _route_objects(self, decoded_objects):
+        """Keep only the current waypoint's code and advance the route on arrival"""
+        objects = [rect for _, rect, _ in self.route.select(decoded_objects)]
+        if not objects:
+            return objects
+        
+        reached = self.route.current
+        largest_object = max(objects, key=lambda obj: obj[2] * obj[3])
+        if not self.route.check_arrival(largest_object, self.resize_width * self.resize_height):
+            return objects
+        
+        print(f"Reached waypoint '{reached}'. {self.route.progress()}")
+        # Forget the old waypoint so tracking does not steer back towards it
+        self.last_qr_rect = None
+        self.roi_misses = 0
+        if self.tracker is not None:
+            self.tracker.reset()
+        if self.steering:
+            self.steering.reset()
+        return []
+    
+    def annotate_frame(self, frame, status, tracked_object):
+        """
+        Resize the frame into the reused display buffer and draw the latest
+        detections and navigation information on it
+        
+        Returns:
+            The annotated display frame (overwritten on the next call)
+        """
+        processed_frame = self.preprocessor.color(frame)
+        self._draw_detections(processed_frame, self.last_detections)
+        self._draw_navigation_info(processed_frame, status, tracked_object)
+        return processed_frame
+    
+    def _draw_detections(self, frame, decoded_objects):
+        for data, (x, y, w, h), points in decoded_objects:
+            # Draw rectangle around QR code
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            
+            # Draw center point
+            center_x = x + w // 2
+            center_y = y + h // 2
+            cv2.circle(frame, (center_x, center_y), 3, (0, 0, 255), -1)
+            
+            # Draw data
+            if data is not None:
+                cv2.putText(frame, data, (x, y - 10), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            
+            # Draw QR code corners
+            if points and len(points) >= 4:
+                # Convert points to numpy array for drawing
+                pts = np.array(points, np.int32)
+                pts = pts.reshape((-1, 1, 2))
+                cv2.polylines(frame, [pts], True, (255, 0, 0), 2)
+    
+    def _tracking_roi(self, shape):
+        """Padded (x0, y0, x1, y1) crop around the last QR code, or None for a full scan"""
+        if not self.roi_tracking or self.last_qr_rect is None:
+            return None
+        if self.decodes_since_full_scan >= self.full_scan_interval:
+            return None
+        
+        x, y, w, h = self.last_qr_rect
+        pad = max(int(max(w, h) * self.roi_padding), 16)
+        height, width = shape[:2]
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        return x0, y0, x1, y1
+    
+    def _scan(self, gray):
+        """
+        Decode QR codes in a grayscale frame, only around the last known
+        location when ROI tracking is active
+        
+        Returns:
+            List of (data, (x, y, w, h), polygon) in full-frame coordinates
+        """
+        detector = self._active_detector()
+        roi = self._tracking_roi(gray.shape)
+        if roi is None and self.prefilter is not None:
+            decoded_objects = detect_regions(detector, gray, self.prefilter.candidates(gray))
+        elif roi is None:
+            decoded_objects = detector.detect(gray)
+        else:
+            x0, y0, x1, y1 = roi
+            decoded_objects = detector.detect(gray[y0:y1, x0:x1])
+        
+        results = self._finish_scan(detector, roi, decoded_objects)
+        if detector is self.localizer and self.target_ambiguous:
+            # Can't tell which code is the target, decode this frame in full
+            return self._scan(gray)
+        return results
+    
+    def _finish_scan(self, detector, roi, decoded_objects):
+        """
+        Translate crop coordinates back to the full frame and update the
+        tracking state with the detections of one scan
+        
+        With a target payload only the target is kept: the decoded codes with
+        its payload, or the localized code that matches its last position. If
+        a localized frame is ambiguous, nothing is returned, the tracking state
+        is left alone and target_ambiguous asks for a full decode.
+        """
+        x0, y0 = (0, 0) if roi is None else roi[:2]
+        
+        # Translate crop coordinates back to the full frame
+        results = []
+        for data, (x, y, w, h), polygon in decoded_objects:
+            polygon = [(px + x0, py + y0) for px, py in polygon]
+            results.append((data, (x + x0, y + y0, w, h), polygon))
+        
+        self.target_ambiguous = False
+        if self.localizer is not None and detector is self.localizer:
+            results = self._match_target(results)
+            if results is None:
+                # Decode the next frame in full instead of following another code
+                self.target_ambiguous = True
+                self.frames_since_verify = self.verify_interval
+                return []
+        elif self.localizer is not None:
+            targets = [result for result in results if result[0] == self.target_payload]
+            results = targets or results
+        
+        if roi is None:
+            self.decodes_since_full_scan = 0
+        else:
+            self.decodes_since_full_scan += 1
+        
+        # Update tracking state (in route mode, follow the current waypoint only)
+        tracked = results if self.route is None else self.route.select(results)
+        if tracked:
+            self.last_qr_rect = max((r[1] for r in tracked), key=lambda r: r[2] * r[3])
+            self.roi_misses = 0
+        elif roi is not None:
+            self.roi_misses += 1
+            if self.roi_misses >= self.roi_max_misses:
+                # Lost it, go back to scanning the whole frame
+                self.last_qr_rect = None
+                self.roi_misses = 0
+        else:
+            self.last_qr_rect = None
+        
+        self._update_target_confirmation(detector, results)
+        
+        return results
+    
+    def _match_target(self, results):
+        """
+        Pick the localized code that is the target: the only one within a code
+        size of its last position
+        
+        Returns:
+            List with the target (empty if nothing was localized), or None if
+            it is ambiguous
+        """
+        if not results:
+            return results
+        if self.last_qr_rect is None:
+            return None
+        
+        x, y, w, h = self.last_qr_rect
+        center_x, center_y = x + w / 2, y + h / 2
+        gate = max(w, h)
+        near = [result for result in results
+                if np.hypot(result[1][0] + result[1][2] / 2 - center_x,
+                            result[1][1] + result[1][3] / 2 - center_y) <= gate]
+        return near if len(near) == 1 else None
+    
+    def _active_detector(self):
+        """Backend for this frame: the decoder, or the localizer once the target is confirmed"""
+        if self.localizer is None or not self.detector.decodes or not self.target_confirmed:
+            return self.detector
+        if self.frames_since_verify >= self.verify_interval:
+            # Time to re-verify the payload with a full decode
+            return self.detector
+        return self.localizer
+    
+    def _update_target_confirmation(self, detector, results):
+        """Track whether the expected payload has been seen by the last full decode"""
+        if self.localizer is None:
+            return
+        if detector is self.localizer:
+            self.frames_since_verify += 1
+            return
+        
+        confirmed = any(data == self.target_payload for data, _, _ in results)
+        if confirmed and not self.target_confirmed:
+            print(f"Target '{self.target_payload}' confirmed, switching to localization only")
+        elif not confirmed and self.target_confirmed:
+            print(f"Target '{self.target_payload}' not verified, decoding every frame")
+        self.target_confirmed = confirmed
+        self.frames_since_verify = 0
+        
+    def navigate(self, objects):
+        if not objects:
+            if self.steering:
+                self.steering.reset()
+            
+            # In route mode, turn in place to look for the next waypoint
+            command = self._search_command()
+            if command is not None:
+                self.send_command(command)
+                return f"Searching for {self.route.current}", None
+            
+            # No QR codes detected, stop
+            self.send_command('S')
+            if self.route is not None and self.route.finished:
+                return self.route.progress(), None
+            return "No QR code detected", None
+        self.search_start = None
+        
+        # For simplicity, track the largest QR code (by area)
+        largest_object = max(objects, key=lambda obj: obj[2] * obj[3])
+        x, y, w, h = largest_object
+        
+        # Calculate center of QR code
+        object_center_x = x + w // 2
+        
+        # Calculate distance from center
+        distance_from_center = object_center_x - self.frame_center_x
+        
+        if self.steering:
+            # Proportional steering, QR size is the distance proxy
+            offset = distance_from_center / self.frame_center_x
+            area = (w * h) / (self.resize_width * self.resize_height)
+            left, right = self.steering.update(offset, area, self.frame_time)
+            self.send_command(encode_motor_command(left, right))
+            return f"Steering L{left:+d} R{right:+d}", largest_object
+        
+        # Determine direction to move
+        if abs(distance_from_center) < self.center_threshold:
+            # QR code is centered, move forward
+            command = 'F'
+            status = "QR centered - Moving forward"
+        elif distance_from_center < 0:
+            # QR code is to the left, turn left
+            command = 'L'
+            status = "QR left - Turning left"
+        else:
+            # QR code is to the right, turn right
+            command = 'R'
+            status = "QR right - Turning right"
+        
+        # Send command to Arduino
+        self.send_command(command)
+        
+        return status, largest_object
+    
+    def navigate_tracked(self, objects):
+        """
+        Navigate on decoded QR codes, bridging gaps with the motion tracker
+        
+        Args:
+            objects: Decoded QR codes, [] if a decode found nothing, or None
+                     if no decode ran on this frame
+            
+        Returns:
+            (status, tracked_object) from navigate, or None if there was
+            nothing to navigate on
+        """
+        predicted = False
+        if self.tracker is not None:
+            now = self.frame_time or time.time()
+            if objects:
+                self.tracker.update(max(objects, key=lambda obj: obj[2] * obj[3]), now)
+            else:
+                rect = self.tracker.predict(now, missed=objects is not None)
+                if rect is not None:
+                    objects = [rect]
+                    predicted = True
+        
+        if objects is None:
+            return None
+        
+        status, tracked_object = self.navigate(objects)
+        if predicted:
+            status += " (predicted)"
+        return status, tracked_object
+    
+    def _search_command(self):
+        """Command to turn in place while looking for the next waypoint, or None to stop"""
+        if self.route is None or self.route.finished or self.search_speed <= 0:
+            return None
+        now = self.frame_time or time.time()
+        if self.search_start is None:
+            self.search_start = now
+        if now - self.search_start > self.search_timeout:
+            return None
+        if self.steering:
+            return encode_motor_command(-self.search_speed, self.search_speed)
+        return 'L'
+    
+    def handle_stream_lost(self):
+        """Stop right away when the camera stream drops, and forget the stale target"""
+        if self.stream_lost:
+            return
+        self.stream_lost = True
+        self.send_command('S')
+        if self.steering:
+            self.steering.reset()
+        if self.tracker is not None:
+            self.tracker.reset()
+        self.last_qr_rect = None
+        self.last_detections = []
+        self.last_status, self.last_tracked_object = "Camera disconnected, reconnecting", None
+    
+    def handle_stream_resumed(self):
+        self.stream_lost = False
+        self.last_status = "Camera reconnected"
+    
+    def _adapt(self, objects):
+        """Let the adaptive controller pick the processing width and decode rate"""
+        code_width = max((w for _, _, w, _ in objects), default=None)
+        width, self.skip_frames = self.adaptive.update(self.last_decode_time, code_width)
+        if width != self.resize_width:
+            self.set_processing_width(width)
+    
+    def set_processing_width(self, width):
+        """Change the processing resolution and rescale the tracking state to match"""
+        factor = width / self.resize_width
+        self.resize_width = width
+        self.resize_height = int(width * self.aspect_ratio)
+        self.frame_center_x = self.resize_width // 2
+        self.center_threshold = int(self.resize_width * 0.1)
+        self.preprocessor.set_size(self.resize_width, self.resize_height)
+        
+        if self.last_qr_rect is not None:
+            self.last_qr_rect = tuple(int(v * factor) for v in self.last_qr_rect)
+        if self.tracker is not None:
+            self.tracker.scale(factor)
+        self.last_detections = []
+    
+    def send_command(self, command):
+        # Only send if command is different from last one
+        if command != self.last_command:
+            if self.serial_writer:
+                # Replaces any older command that has not been written yet
+                self.serial_writer.submit(command, frame_time=self.frame_time)
+            
+            # Update command history (keep last 3)
+            self.command_history.append((time.time(), command))
+            if len(self.command_history) > 3:
+                self.command_history.pop(0)
+            
+            self.last_command = command
+    
+    def calibrate_detector(self, read_frame=None):
+        """
+        Time every available backend on a few live frames and keep the fastest reliable one
+        
+        Args:
+            read_frame: Callable returning (ret, frame) (default: the frame grabber)
+        """
+        if read_frame is None:
+            read_frame = lambda: self.grabber.read(timeout=5.0)[:2]
+        
+        print(f"Calibrating QR detectors on {self.calibration_frames} frames...")
+        frames = []
+        while len(frames) < self.calibration_frames:
+            ret, frame = read_frame()
+            if not ret:
+                break
+            frames.append(self.preprocessor.gray(frame).copy())
+        
+        self.detector, results = select_fastest_detector(frames)
+        for name, (ms, rate) in sorted(results.items(), key=lambda item: item[1][0]):
+            print(f"  {name:<14} {ms:6.1f} ms/frame  detected in {rate * 100:3.0f}% of frames")
+        print(f"Using QR detector: {self.detector.name}")
+    
+    def run(self):
+        # Stop cleanly on Ctrl+C or a service manager's SIGTERM
+        self.running = True
+        previous_handlers = install_stop_handlers(self.stop)
+        
+        self.grabber.start()
+        if self.detector is None:
+            self.calibrate_detector()
+        while self.running:
+            # Always take the newest frame, anything older has been dropped
+            with self.latency.measure('capture_wait'):
+                ret, frame, frame_time = self.grabber.read(timeout=0.5)
+            if not ret:
+                if self.grabber.failed:
+                    print("Failed to retrieve frame from camera")
+                    break
+                if not self.grabber.connected:
+                    self.handle_stream_lost()
+                continue  # No new frame yet, check self.running again
+            if self.stream_lost:
+                self.handle_stream_resumed()
+            self.frame_time = frame_time
+            
+            # Frame skipping for performance
+            self.frame_count += 1
+            if self.frame_count % self.skip_frames != 0:
+                # Keep steering on the predicted target position between decodes
+                with self.latency.measure('navigate'):
+                    result = self.navigate_tracked(None)
+                if result is not None:
+                    self.last_status, self.last_tracked_object = result
+                
+                # Update FPS display but skip processing
+                self._update_fps()
+                if self.headless:
+                    continue
+                
+                # Just show the frame with minimal processing
+                with self.latency.measure('resize'):
+                    small_frame = self.preprocessor.color(frame)
+                cv2.putText(small_frame, f"FPS: {self.fps}", (10, self.resize_height - 10), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+                with self.latency.measure('imshow'):
+                    cv2.imshow("QR Navigation", small_frame)
+                    
+                    # Check for key press
+                    key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    break
+                
+                continue
+            
+            frame_start = time.perf_counter()
+            
+            # In headless mode only preview and telemetry frames are annotated
+            preview = self.headless and self._preview_due()
+            annotate = not self.headless or preview or self._stream_due()
+            
+            # Grayscale and resize into reused buffers
+            with self.latency.measure('preprocess'):
+                gray = self.preprocessor.gray(frame)
+            
+            # Detect QR codes
+            with self.latency.measure('detect'):
+                if self.decode_workers:
+                    objects = self.decode_gray_pooled(gray)
+                else:
+                    objects = self.decode_gray(gray)
+            
+            # Navigate based on detected QR codes (with the pool, the tracker
+            # prediction is used until a newer result is ready)
+            with self.latency.measure('navigate'):
+                result = self.navigate_tracked(objects)
+            if result is not None:
+                self.last_status, self.last_tracked_object = result
+            if objects is not None:
+                self.processed_count += 1
+                if self.adaptive is not None:
+                    self._adapt(objects)
+            status, tracked_object = self.last_status, self.last_tracked_object
+            
+            # Calculate FPS
+            self._update_fps()
+            
+            if not annotate:
+                self.latency.record('frame', time.perf_counter() - frame_start)
+                continue
+            
+            # Draw detections and navigation information
+            with self.latency.measure('draw'):
+                processed_frame = self.annotate_frame(frame, status, tracked_object)
+            if self.telemetry_server is not None:
+                self.telemetry_server.publish_frame(processed_frame)
+            
+            if self.headless:
+                if preview:
+                    with self.latency.measure('preview'):
+                        self._write_preview(processed_frame)
+                self.latency.record('frame', time.perf_counter() - frame_start)
+                continue
+            
+            # Show processed frame
+            with self.latency.measure('imshow'):
+                cv2.imshow("QR Navigation", processed_frame)
+                
+                # Break loop if 'q' is pressed
+                key = cv2.waitKey(1) & 0xFF
+            self.latency.record('frame', time.perf_counter() - frame_start)
+            if key == ord('q'):
+                break
+        
+        # Clean up
+        if not self.headless:
+            cv2.destroyAllWindows()
+        restore_signal_handlers(previous_handlers)
+        self.close()
+    
+    def run_async(self, **runtime_options):
+        """
+        Run with the asyncio runtime instead of the blocking loop in run()
+        
+        Args:
+            runtime_options: AsyncNavigationRuntime keyword arguments
+        """
+        import asyncio
+        from async_runtime import AsyncNavigationRuntime
+        asyncio.run(AsyncNavigationRuntime(self, **runtime_options).run())
+    
+    def status_snapshot(self):
+        """Current navigation state as a JSON-serializable dict"""
+        offset = None
+        if self.last_tracked_object:
+            x, _, w, _ = self.last_tracked_object
+            offset = x + w // 2 - self.frame_center_x
+        return {
+            'time': time.time(),
+            'status': self.last_status,
+            'qr_data': self.qr_data,
+            'tracked_object': list(self.last_tracked_object) if self.last_tracked_object else None,
+            'offset_px': offset,
+            'last_command': describe_command(self.last_command) if self.last_command is not None else None,
+            'fps': self.fps,
+            'processed_fps': self.processed_fps,
+            'frames_dropped': self.grabber.frames_dropped,
+            'camera_connected': self.grabber.connected,
+            'camera_reconnects': self.grabber.reconnects,
+            'camera_downtime_s': round(self.grabber.downtime, 2),
+            'resize_width': self.resize_width,
+            'skip_frames': self.skip_frames,
+            'route': self.route.progress() if self.route is not None else None,
+            'prefilter': self.prefilter.stats() if self.prefilter is not None else None,
+            'latency_ms': {stage: {key: summary[key] for key in ('p50', 'p95', 'p99')}
+                           for stage, summary in self.latency.summary().items()},
+        }
+    
+    def stop(self):
+        """Make run() end after the current frame"""
+        self.running = False
+    
+    def _preview_due(self):
+        """Whether the current processed frame should be annotated for the preview"""
+        if not self.preview_file or self.preview_interval <= 0:
+            return False
+        self.preview_counter += 1
+        return self.preview_counter % self.preview_interval == 0
+    
+    def _stream_due(self):
+        """Whether the telemetry stream wants an annotated frame now"""
+        return self.telemetry_server is not None and self.telemetry_server.frame_due()
+    
+    def _write_preview(self, frame):
+        """Atomically replace the preview image so readers never see a partial file"""
+        root, ext = os.path.splitext(self.preview_file)
+        tmp_file = f"{root}.tmp{ext or '.jpg'}"
+        if cv2.imwrite(tmp_file, frame):
+            os.replace(tmp_file, self.preview_file)
+    
+    def _update_fps(self):
+        """Update the captured (fps) and processed (processed_fps) frame rates once per second"""
+        if time.time() - self.last_frame_time >= 1.0:
+            self.fps = self.frame_count
+            self.processed_fps = self.processed_count
+            self.frame_count = 0
+            self.processed_count = 0
+            self.last_frame_time = time.time()
+    
+    def close(self):
+        """Stop the capture thread, stop the motors and release the serial port"""
+        self.grabber.stop()
+        if self.telemetry_server is not None:
+            self.telemetry_server.stop()
+            self.telemetry_server = None
+        print(f"Frames captured: {self.grabber.frames_grabbed}, "
+              f"dropped as stale: {self.grabber.frames_dropped}")
+        if self.grabber.reconnects or not self.grabber.connected:
+            print(f"Camera reconnects: {self.grabber.reconnects}, "
+                  f"downtime: {self.grabber.downtime:.1f}s")
+        if self.prefilter is not None:
+            print(f"Prefilter: {self.prefilter.frames_filtered} of {self.prefilter.frames_checked} "
+                  f"full scans skipped, {self.prefilter.frames_full} decoded whole")
+        if self.decode_pool is not None and self.owns_decode_pool:
+            print(f"Decode pool: {self.decode_pool.frames_submitted} submitted, "
+                  f"{self.decode_pool.frames_rejected} rejected (workers busy), "
+                  f"{self.decode_pool.results_dropped} stale results dropped")
+            self.decode_pool.close()
+        self.decode_pool = None
+        if self.arduino:
+            # Send one stop command, written out before the port is closed
+            self.serial_writer.submit('S')
+            self.serial_writer.close()
+            self.arduino.flush()
+            self.arduino.close()
+        
+        # Report where the time went
+        self.latency.print_summary()
+        if self.trace_file:
+            self.latency.dump_trace(self.trace_file)
+    
+    def _draw_navigation_info(self, frame, status, tracked_object):
+        # Draw center line
+        cv2.line(frame, (self.frame_center_x, 0), (self.frame_center_x, self.resize_height), 
+                 (255, 0, 0), 1)
+        
+        # Draw center threshold zone
+        left_threshold = self.frame_center_x - self.center_threshold
+        right_threshold = self.frame_center_x + self.center_threshold
+        cv2.line(frame, (left_threshold, 0), (left_threshold, self.resize_height), 
+                 (255, 0, 0), 1)
+        cv2.line(frame, (right_threshold, 0), (right_threshold, self.resize_height), 
+                 (255, 0, 0), 1)
+        
+        # Draw status text and FPS
+        cv2.putText(frame, status, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 
+                    0.6, (0, 0, 255), 2)
+        cv2.putText(frame, f"FPS: {self.fps} Processed: {self.processed_fps} "
+                    f"Dropped: {self.grabber.frames_dropped}", 
+                    (10, self.resize_height - 10), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+        
+        # Draw command history (reduced for optimization)
+        for i, (timestamp, cmd) in enumerate(self.command_history[-2:]):
+            elapsed = time.time() - timestamp
+            cmd_text = f"{describe_command(cmd)}: {elapsed:.1f}s ago"
+            cv2.putText(frame, cmd_text, (10, 50 + i*20), cv2.FONT_HERSHEY_SIMPLEX, 
+                        0.4, (0, 255, 0), 1)
+        
+        # Draw route progress
+        if self.route is not None:
+            cv2.putText(frame, self.route.progress(), (10, 95), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, (255, 0, 255), 1)
+        
+        # Draw tracked object info if available
+        if tracked_object:
+            x, y, w, h = tracked_object
+            object_center_x = x + w // 2
+            
+            # Draw object center position info
+            distance_text = f"Offset: {object_center_x - self.frame_center_x:+d}px"
+            cv2.putText(frame, distance_text, (frame.shape[1] - 150, frame.shape[0] - 10), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
@@ -1,17 +1,12 @@
-import cv2
-import numpy as np
-import serial
-import time
+import argparse
+import json
 import os
-try:
-    import pyzbar.pyzbar as pyzbar
-except ImportError:
-    print("pyzbar not installed. Please install with: pip install pyzbar")
-    print("Note: On Windows, you may also need to install the Visual C++ Redistributable.")
-    exit(1)
 
 def get_user_input():
     """Get configuration from user input"""
+    from qr_detectors import DETECTORS, PyzbarDetector
+    from route import load_route
+    
     print("\n===== QR Code Auto Navigation Robot (pyzbar) =====\n")
     
     # Get camera URL
@@ -40,307 +35,278 @@ def get_user_input():
         print(f"Invalid width, using default: {default_width}")
         frame_width = default_width
     
-    # Get frame skip
-    default_skip = 2
-    skip_input = input(f"Enter frame skip factor (higher = faster) (default: {default_skip}): ")
+    # Get frame skip (stale frames are already dropped by the capture thread)
+    default_skip = 1
+    skip_input = input(f"Enter frame skip factor (decode every Nth frame) (default: {default_skip}): ")
     try:
         skip_frames = int(skip_input) if skip_input.strip() else default_skip
     except ValueError:
         print(f"Invalid skip factor, using default: {default_skip}")
         skip_frames = default_skip
     
+    # Get detector backend
+    default_detector = "pyzbar" if PyzbarDetector.is_available() else "auto"
+    choices = "/".join(list(DETECTORS) + ["auto"])
+    detector_input = input(f"Enter QR detector ({choices}) (default: {default_detector}): ").strip()
+    if detector_input and detector_input not in DETECTORS and detector_input != "auto":
+        print(f"Unknown detector, using default: {default_detector}")
+        detector_input = ""
+    detector = detector_input or default_detector
+    
+    # Get expected target payload
+    target_input = input("Enter expected QR payload to skip decoding once confirmed (e.g., ROBOT_TARGET) (default: none): ")
+    target_payload = target_input.strip() or None
+    
+    # Get route
+    route_input = input("Enter route waypoints, comma separated or a file with one per line (default: none): ")
+    route = load_route(route_input.strip()) if route_input.strip() else None
+    
+    # Get adaptive mode
+    adaptive_input = input("Adapt frame width and skip automatically? (y/N): ")
+    adaptive = adaptive_input.strip().lower() in ('y', 'yes')
+    
+    # Get prefilter
+    prefilter_input = input("Skip decoding frames without QR-like regions (cheap prefilter)? (y/N): ")
+    prefilter = prefilter_input.strip().lower() in ('y', 'yes')
+    
+    # Get decode worker processes
+    workers_input = input("Enter number of decode worker processes (0 decodes in the control loop) (default: 0): ")
+    try:
+        decode_workers = max(0, int(workers_input)) if workers_input.strip() else 0
+    except ValueError:
+        print("Invalid number of workers, decoding in the control loop")
+        decode_workers = 0
+    
+    # Get steering mode
+    steering_input = input("Enter steering mode (pid/bang) (default: pid): ").strip().lower()
+    steering = steering_input if steering_input in ('pid', 'bang') else 'pid'
+    
+    # Get display mode
+    headless_input = input("Run headless without a display window? (y/N): ")
+    headless = headless_input.strip().lower() in ('y', 'yes')
+    preview_file = None
+    if headless:
+        preview_input = input("Write an annotated preview image to (default: none): ")
+        preview_file = preview_input.strip() or None
+    
+    # Get telemetry port
+    telemetry_input = input("Serve telemetry and video over HTTP on port (e.g., 8090) (default: none): ")
+    try:
+        telemetry_port = int(telemetry_input) if telemetry_input.strip() else None
+    except ValueError:
+        print("Invalid port, telemetry disabled")
+        telemetry_port = None
+    
+    # Get runtime
+    async_input = input("Use the asyncio runtime (capture, decode and serial I/O run concurrently)? (y/N): ")
+    use_async = async_input.strip().lower() in ('y', 'yes')
+    
     print("\nStarting QR code navigation with these settings:")
     print(f"Camera URL: {camera_url}")
     print(f"Arduino Port: {port}")
     print(f"Baud Rate: {baud_rate}")
     print(f"Frame Width: {frame_width}")
     print(f"Frame Skip: {skip_frames}")
+    print(f"QR Detector: {detector}")
+    print(f"Target Payload: {target_payload or 'none'}")
+    print(f"Route: {' -> '.join(route) if route else 'none'}")
+    print(f"Adaptive: {'yes' if adaptive else 'no'}")
+    print(f"Prefilter: {'yes' if prefilter else 'no'}")
+    print(f"Decode Workers: {decode_workers or 'none'}")
+    print(f"Steering: {steering}")
+    print(f"Headless: {'yes' if headless else 'no'}")
+    print(f"Telemetry Port: {telemetry_port or 'none'}")
+    print(f"Runtime: {'asyncio' if use_async else 'loop'}")
     
     return {
         'camera_url': camera_url,
         'port': port,
         'baud_rate': baud_rate,
         'frame_width': frame_width,
-        'skip_frames': skip_frames
+        'skip_frames': skip_frames,
+        'detector': detector,
+        'target_payload': target_payload,
+        'route': route,
+        'adaptive': adaptive,
+        'prefilter': prefilter,
+        'decode_workers': decode_workers,
+        'steering': steering,
+        'headless': headless,
+        'preview_file': preview_file,
+        'telemetry_port': telemetry_port,
+        'use_async': use_async
     }
 
-class QRNavigationRobot:
-    def __init__(self, camera_url, arduino_port, baud_rate=9600, resize_width=640, skip_frames=2):
-        # Connect to camera
-        print(f"\nConnecting to camera at {camera_url}...")
-        self.cap = cv2.VideoCapture(camera_url)
-        if not self.cap.isOpened():
-            raise ValueError(f"Could not open video stream from {camera_url}")
-        
-        # Performance optimizations
-        self.resize_width = resize_width
-        self.skip_frames = max(1, skip_frames)
-        self.frame_count = 0
-        
-        # Get frame dimensions
-        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        self.aspect_ratio = self.frame_height / self.frame_width
-        self.resize_height = int(self.resize_width * self.aspect_ratio)
-        
-        print(f"Original camera resolution: {self.frame_width}x{self.frame_height}")
-        print(f"Processing at resolution: {self.resize_width}x{self.resize_height}")
-        print(f"Processing every {self.skip_frames} frame(s)")
-        
-        # Connect to Arduino
-        try:
-            print(f"Connecting to Arduino on {arduino_port}...")
-            self.arduino = serial.Serial(arduino_port, baud_rate, timeout=1)
-            time.sleep(2)  # Wait for connection to establish
-            print(f"Connected to Arduino on {arduino_port}")
-        except Exception as e:
-            self.arduino = None
-            print(f"Warning: Could not connect to Arduino: {e}")
-            print("Running in simulation mode (no Arduino control)")
-        
-        # Navigation parameters
-        self.frame_center_x = self.resize_width // 2
-        self.center_threshold = int(self.resize_width * 0.1)  # 10% of frame width
-        
-        # Control parameters
-        self.last_command = None
-        self.command_history = []
-        self.qr_data = None  # Store the most recent QR code data
-        
-        # Performance tracking
-        self.last_frame_time = time.time()
-        self.fps = 0
-        
-        # Display controls
-        print("\nPress 'q' to quit")
-        
-    def detect_qr_codes(self, frame):
-        """
-        Detect QR codes using pyzbar
-        
-        Args:
-            frame: Input video frame
-            
-        Returns:
-            processed_frame: Frame with detection markers
-            objects: List of QR codes as (x, y, w, h) tuples
-        """
-        # Make a copy for drawing
-        processed_frame = frame.copy()
-        
-        # Convert to grayscale for better detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect QR codes
-        decoded_objects = pyzbar.decode(gray)
-        
-        # List to store QR code locations
-        objects = []
-        
-        for obj in decoded_objects:
-            # Get data and bounding box
-            data = obj.data.decode('utf-8')
-            x, y, w, h = obj.rect
-            
-            # Store QR code data
-            self.qr_data = data
-            
-            # Add to objects list
-            objects.append((x, y, w, h))
-            
-            # Draw rectangle around QR code
-            cv2.rectangle(processed_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            
-            # Draw center point
-            center_x = x + w // 2
-            center_y = y + h // 2
-            cv2.circle(processed_frame, (center_x, center_y), 3, (0, 0, 255), -1)
-            
-            # Draw data
-            cv2.putText(processed_frame, data, (x, y - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            
-            # Draw QR code corners
-            points = obj.polygon
-            if points and len(points) >= 4:
-                # Convert points to numpy array for drawing
-                pts = np.array(points, np.int32)
-                pts = pts.reshape((-1, 1, 2))
-                cv2.polylines(processed_frame, [pts], True, (255, 0, 0), 2)
-        
-        return processed_frame, objects
-        
-    def navigate(self, objects):
-        if not objects:
-            # No QR codes detected, stop
-            self.send_command('S')
-            return "No QR code detected", None
-        
-        # For simplicity, track the largest QR code (by area)
-        largest_object = max(objects, key=lambda obj: obj[2] * obj[3])
-        x, y, w, h = largest_object
-        
-        # Calculate center of QR code
-        object_center_x = x + w // 2
-        
-        # Calculate distance from center
-        distance_from_center = object_center_x - self.frame_center_x
-        
-        # Determine direction to move
-        if abs(distance_from_center) < self.center_threshold:
-            # QR code is centered, move forward
-            command = 'F'
-            status = "QR centered - Moving forward"
-        elif distance_from_center < 0:
-            # QR code is to the left, turn left
-            command = 'L'
-            status = "QR left - Turning left"
-        else:
-            # QR code is to the right, turn right
-            command = 'R'
-            status = "QR right - Turning right"
-        
-        # Send command to Arduino
-        self.send_command(command)
-        
-        return status, largest_object
+# Settings used when running from a config file or command line arguments
+DEFAULT_CONFIG = {
+    'camera_url': None,
+    'port': "COM3",
+    'baud_rate': 9600,
+    'frame_width': 640,
+    'skip_frames': 1,
+    'detector': None,  # pyzbar if installed, otherwise auto
+    'target_payload': None,
+    'route': None,
+    'adaptive': False,
+    'prefilter': False,
+    'decode_workers': 0,
+    'steering': "pid",
+    'headless': False,
+    'preview_file': None,
+    'telemetry_port': None,
+    'use_async': False
+}
+
+def load_config(path):
+    """
+    Read settings from a JSON file with DEFAULT_CONFIG keys
     
-    def send_command(self, command):
-        # Only send if command is different from last one
-        if command != self.last_command:
-            if self.arduino:
-                self.arduino.write(command.encode())
-                time.sleep(0.05)  # Reduced delay for better responsiveness
-            
-            # Update command history (keep last 3)
-            self.command_history.append((time.time(), command))
-            if len(self.command_history) > 3:
-                self.command_history.pop(0)
-            
-            self.last_command = command
+    Returns:
+        Dict of the settings in the file
+    """
+    with open(path) as f:
+        config = json.load(f)
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown settings in {path}: {', '.join(sorted(unknown))}")
+    return config
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='QR code navigation robot. Without --config or --camera, settings are asked for interactively.')
+    parser.add_argument('--config', type=str, default=None,
+                        help='JSON settings file (keys as in DEFAULT_CONFIG), overridden by the options below')
+    parser.add_argument('--camera', dest='camera_url', type=str, default=None,
+                        help='IP camera URL')
+    parser.add_argument('--port', type=str, default=None,
+                        help='Arduino serial port')
+    parser.add_argument('--baud', dest='baud_rate', type=int, default=None,
+                        help='Baud rate')
+    parser.add_argument('--width', dest='frame_width', type=int, default=None,
+                        help='Frame processing width')
+    parser.add_argument('--skip', dest='skip_frames', type=int, default=None,
+                        help='Decode every Nth frame')
+    parser.add_argument('--detector', type=str, default=None,
+                        help='QR detector backend (see qr_detectors.DETECTORS) or auto')
+    parser.add_argument('--target-payload', type=str, default=None,
+                        help='Expected QR payload for localization-only tracking')
+    parser.add_argument('--route', type=str, default=None,
+                        help='Waypoint payloads, comma separated or a file with one per line')
+    parser.add_argument('--adaptive', action='store_true', default=None,
+                        help='Adapt frame width and skip automatically')
+    parser.add_argument('--prefilter', action='store_true', default=None,
+                        help='Skip decoding frames without QR-like regions')
+    parser.add_argument('--decode-workers', type=int, default=None,
+                        help='Decode on this many worker processes (0 decodes in the control loop)')
+    parser.add_argument('--steering', type=str, choices=['pid', 'bang'], default=None,
+                        help='Steering mode')
+    parser.add_argument('--headless', action='store_true', default=None,
+                        help='Run without a display window')
+    parser.add_argument('--preview-file', type=str, default=None,
+                        help='Write an annotated preview image here when headless')
+    parser.add_argument('--telemetry-port', type=int, default=None,
+                        help='Serve telemetry and video over HTTP on this port')
+    parser.add_argument('--async', dest='use_async', action='store_true', default=None,
+                        help='Use the asyncio runtime')
+    return parser, parser.parse_args(argv)
+
+def resolve_detector(detector):
+    """
+    Pick the default QR detector and check that the chosen one can be created
     
-    def run(self):
-        while True:
-            ret, frame = self.cap.read()
-            if not ret:
-                print("Failed to retrieve frame from camera")
-                break
-            
-            # Frame skipping for performance
-            self.frame_count += 1
-            if self.frame_count % self.skip_frames != 0:
-                # Update FPS display but skip processing
-                if time.time() - self.last_frame_time >= 1.0:
-                    self.fps = self.frame_count
-                    self.frame_count = 0
-                    self.last_frame_time = time.time()
-                
-                # Just show the frame with minimal processing
-                small_frame = cv2.resize(frame, (self.resize_width, self.resize_height))
-                cv2.putText(small_frame, f"FPS: {self.fps}", (10, self.resize_height - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-                cv2.imshow("QR Navigation", small_frame)
-                
-                # Check for key press
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    break
-                
-                continue
-            
-            # Resize for faster processing
-            small_frame = cv2.resize(frame, (self.resize_width, self.resize_height))
-            
-            # Detect QR codes
-            processed_frame, objects = self.detect_qr_codes(small_frame)
-            
-            # Navigate based on detected QR codes
-            status, tracked_object = self.navigate(objects)
-            
-            # Calculate FPS
-            if time.time() - self.last_frame_time >= 1.0:
-                self.fps = self.frame_count
-                self.frame_count = 0
-                self.last_frame_time = time.time()
-            
-            # Draw navigation information
-            self._draw_navigation_info(processed_frame, status, tracked_object)
-            
-            # Show processed frame
-            cv2.imshow("QR Navigation", processed_frame)
-            
-            # Break loop if 'q' is pressed
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-        
-        # Clean up
-        self.cap.release()
-        cv2.destroyAllWindows()
-        if self.arduino:
-            # Send stop command before closing
-            self.send_command('S')
-            self.arduino.close()
+    Args:
+        detector: Detector name, "auto", or None for the default
     
-    def _draw_navigation_info(self, frame, status, tracked_object):
-        # Draw center line
-        cv2.line(frame, (self.frame_center_x, 0), (self.frame_center_x, self.resize_height), 
-                 (255, 0, 0), 1)
-        
-        # Draw center threshold zone
-        left_threshold = self.frame_center_x - self.center_threshold
-        right_threshold = self.frame_center_x + self.center_threshold
-        cv2.line(frame, (left_threshold, 0), (left_threshold, self.resize_height), 
-                 (255, 0, 0), 1)
-        cv2.line(frame, (right_threshold, 0), (right_threshold, self.resize_height), 
-                 (255, 0, 0), 1)
-        
-        # Draw status text and FPS
-        cv2.putText(frame, status, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 
-                    0.6, (0, 0, 255), 2)
-        cv2.putText(frame, f"FPS: {self.fps}", (10, self.resize_height - 10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-        
-        # Draw command history (reduced for optimization)
-        for i, (timestamp, cmd) in enumerate(self.command_history[-2:]):
-            elapsed = time.time() - timestamp
-            cmd_text = f"{cmd}: {elapsed:.1f}s ago"
-            cv2.putText(frame, cmd_text, (10, 50 + i*20), cv2.FONT_HERSHEY_SIMPLEX, 
-                        0.4, (0, 255, 0), 1)
-        
-        # Draw tracked object info if available
-        if tracked_object:
-            x, y, w, h = tracked_object
-            object_center_x = x + w // 2
-            
-            # Draw object center position info
-            distance_text = f"Offset: {object_center_x - self.frame_center_x:+d}px"
-            cv2.putText(frame, distance_text, (frame.shape[1] - 150, frame.shape[0] - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+    Returns:
+        Detector name for QRNavigationRobot
+    """
+    from qr_detectors import DETECTORS, PyzbarDetector
+    
+    if detector is None:
+        return "pyzbar" if PyzbarDetector.is_available() else "auto"
+    if detector == "auto":
+        return detector
+    if detector not in DETECTORS:
+        raise ValueError(f"Unknown QR detector '{detector}', choose from: {', '.join(list(DETECTORS) + ['auto'])}")
+    if not DETECTORS[detector].is_available():
+        raise ValueError(f"QR detector '{detector}' is not available in this environment")
+    return detector
 
-def main():
-    # Clear screen for better UI
-    os.system('cls' if os.name == 'nt' else 'clear')
+def create_robot(config, **options):
+    """
+    Create a QRNavigationRobot from DEFAULT_CONFIG style settings
     
-    # Get user input for configuration
-    config = get_user_input()
+    Args:
+        config: Settings dict with every DEFAULT_CONFIG key
+        options: Extra QRNavigationRobot keyword arguments
+    """
+    # Heavy imports (OpenCV, numpy, pyserial) only once a robot is really created,
+    # so --help and config errors return right away
+    from navigation_robot import QRNavigationRobot
+    from route import load_route
     
-    # Create and run the navigation system
-    nav = QRNavigationRobot(
+    detector = resolve_detector(config['detector'])
+    route = config['route']
+    if isinstance(route, str):
+        route = load_route(route)
+    
+    return QRNavigationRobot(
         camera_url=config['camera_url'],
         arduino_port=config['port'],
         baud_rate=config['baud_rate'],
         resize_width=config['frame_width'],
-        skip_frames=config['skip_frames']
+        skip_frames=config['skip_frames'],
+        detector=detector,
+        target_payload=config['target_payload'],
+        route=route,
+        adaptive=config['adaptive'],
+        prefilter=config['prefilter'],
+        decode_workers=config['decode_workers'],
+        steering=config['steering'],
+        headless=config['headless'],
+        preview_file=config['preview_file'],
+        telemetry_port=config['telemetry_port'],
+        **options
     )
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+    overrides = {key: value for key, value in vars(args).items() if key != 'config' and value is not None}
+    
+    interactive = args.config is None and not overrides
+    if interactive:
+        # Clear screen for better UI
+        os.system('cls' if os.name == 'nt' else 'clear')
+        
+        # Get user input for configuration
+        config = get_user_input()
+    else:
+        config = dict(DEFAULT_CONFIG)
+        try:
+            if args.config:
+                config.update(load_config(args.config))
+            config.update(overrides)
+            config['detector'] = resolve_detector(config['detector'])
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if not config['camera_url']:
+            parser.error("a camera URL is required (--camera or camera_url in the config file)")
+    
+    # Create and run the navigation system
+    nav = create_robot(config)
     
     # Run the navigation
     try:
-        nav.run()
+        if config['use_async']:
+            nav.run_async()
+        else:
+            nav.run()
     except KeyboardInterrupt:
         print("Program terminated by user")
     except Exception as e:
         print(f"Error: {e}")
+        if not interactive:
+            raise SystemExit(1)
         input("\nPress Enter to exit...")
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class QRDetector:
+    """
+    Common interface for QR code detection backends.
+
+    Every backend implements detect(gray): it takes a single-channel uint8
+    image and returns a list of (data, (x, y, w, h), polygon) tuples. data
+    is None for backends that only localize codes without decoding them
+    (decodes is False for those).
+    """
+
+    name = None
+    decodes = True
+
+    @classmethod
+    def is_available(cls):
+        """Whether the backend can be used in this environment"""
+        return True
+
+    @staticmethod
+    def _from_points(data, points):
+        """Build a detection tuple from a 4x2 array of corner points"""
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        x, y, w, h = cv2.boundingRect(pts)
+        polygon = [(int(px), int(py)) for px, py in pts]
+        return data, (x, y, w, h), polygon
+
+
+class PyzbarDetector(QRDetector):
+    """Decode with the zbar library"""
+
+    name = "pyzbar"
+
+    def __init__(self):
+        import pyzbar.pyzbar as pyzbar
+        self._pyzbar = pyzbar
+
+    @classmethod
+    def is_available(cls):
+        try:
+            import pyzbar.pyzbar  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def detect(self, gray):
+        results = []
+        for obj in self._pyzbar.decode(gray):
+            polygon = [(int(px), int(py)) for px, py in obj.polygon]
+            results.append((obj.data.decode('utf-8'), tuple(obj.rect), polygon))
+        return results
+
+
+class OpenCVDetector(QRDetector):
+    """Detect and decode a single code with cv2.QRCodeDetector"""
+
+    name = "opencv"
+
+    def __init__(self):
+        self._detector = cv2.QRCodeDetector()
+
+    @classmethod
+    def is_available(cls):
+        return hasattr(cv2, "QRCodeDetector")
+
+    def detect(self, gray):
+        data, points, _ = self._detector.detectAndDecode(gray)
+        if points is None or not data:
+            return []
+        return [self._from_points(data, points)]
+
+
+class OpenCVMultiDetector(OpenCVDetector):
+    """Detect and decode several codes at once with detectAndDecodeMulti"""
+
+    name = "opencv-multi"
+
+    def detect(self, gray):
+        ok, decoded_info, points, _ = self._detector.detectAndDecodeMulti(gray)
+        if not ok or points is None:
+            return []
+        return [self._from_points(data, pts)
+                for data, pts in zip(decoded_info, points) if data]
+
+
+class OpenCVArucoDetector(OpenCVMultiDetector):
+    """detectAndDecodeMulti with the ArUco based finder (OpenCV 4.8+)"""
+
+    name = "opencv-aruco"
+
+    def __init__(self):
+        self._detector = cv2.QRCodeDetectorAruco()
+
+    @classmethod
+    def is_available(cls):
+        return hasattr(cv2, "QRCodeDetectorAruco")
+
+
+class DetectOnlyDetector(OpenCVDetector):
+    """Localize codes with QRCodeDetector.detectMulti and skip decoding"""
+
+    name = "detect-only"
+    decodes = False
+
+    def detect(self, gray):
+        ok, points = self._detector.detectMulti(gray)
+        if not ok or points is None:
+            return []
+        return [self._from_points(None, pts) for pts in points]
+
+
+# Registered backends, in order of preference
+DETECTORS = {
+    cls.name: cls for cls in (
+        PyzbarDetector,
+        OpenCVDetector,
+        OpenCVMultiDetector,
+        OpenCVArucoDetector,
+        DetectOnlyDetector,
+    )
+}
+
+
+def available_detectors():
+    """Names of the backends that can be created in this environment"""
+    return [name for name, cls in DETECTORS.items() if cls.is_available()]
+
+
+def create_detector(name):
+    """
+    Create a detection backend by name
+
+    Args:
+        name: One of the keys of DETECTORS
+
+    Returns:
+        QRDetector instance
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown QR detector '{name}', choose from: {', '.join(DETECTORS)}")
+    if not DETECTORS[name].is_available():
+        raise ImportError(f"QR detector '{name}' is not available in this environment")
+    return DETECTORS[name]()
+
+
+def benchmark_detector(detector, frames):
+    """
+    Time a detector on a list of grayscale frames
+
+    Returns:
+        ms_per_frame: Average detection time in milliseconds
+        detection_rate: Fraction of frames with at least one code found
+    """
+    hits = 0
+    start = time.perf_counter()
+    for gray in frames:
+        if detector.detect(gray):
+            hits += 1
+    elapsed = time.perf_counter() - start
+    count = max(1, len(frames))
+    return elapsed * 1000 / count, hits / count
+
+
+def select_fastest_detector(frames, names=None, min_relative_rate=0.9, require_decode=True):
+    """
+    Pick the fastest backend that still detects reliably on sample frames
+
+    A backend is considered reliable when its detection rate is at least
+    min_relative_rate times the best rate measured across all backends.
+
+    Args:
+        frames: Grayscale frames captured from the live stream
+        names: Backends to try (default: every available one)
+        min_relative_rate: Required detection rate relative to the best backend
+        require_decode: Skip backends that do not decode the payload
+
+    Returns:
+        detector: The selected QRDetector instance
+        results: Dict of name -> (ms_per_frame, detection_rate)
+    """
+    if names is None:
+        names = available_detectors()
+
+    detectors = {}
+    results = {}
+    for name in names:
+        if require_decode and not DETECTORS[name].decodes:
+            continue
+        try:
+            detector = create_detector(name)
+            # Warm up once so one-time initialization is not timed
+            if frames:
+                detector.detect(frames[0])
+            results[name] = benchmark_detector(detector, frames)
+            detectors[name] = detector
+        except (ImportError, cv2.error) as e:
+            print(f"Skipping QR detector '{name}': {e}")
+
+    if not detectors:
+        raise RuntimeError("No QR detector backend is available")
+
+    best_rate = max(rate for _, rate in results.values())
+    reliable = [name for name, (_, rate) in results.items()
+                if rate >= best_rate * min_relative_rate]
+    fastest = min(reliable, key=lambda name: results[name][0])
+    return detectors[fastest], results
@@ -0,0 +1,240 @@
+import argparse
+import sys
+
+import cv2
+import numpy as np
+
+from frame_preprocess import reuse_buffer
+
+
+class QRPrefilter:
+    """
+    Cheap check for regions that could hold a QR code, run before decoding.
+
+    A QR code is a dense patch of high-contrast edges. The morphological
+    gradient (3x3 max - min) is thresholded at min_contrast, and the share
+    of strong edge pixels is averaged over cells of cell_size pixels by an
+    INTER_AREA resize. Cells above min_density are closed into blobs, and
+    every blob at least min_cells cells wide and high is a candidate.
+
+    The edge density of a code falls as its modules get larger, so the check
+    is repeated on pyrDown halvings of the frame (levels counts the full
+    size too): modules too big to look dense at full size look dense at a
+    coarser level. Straight
+    edges fill a quarter of a cell at every level and are never dense.
+
+    Flat finder patterns and the quiet zone fall outside the blob, so each
+    candidate is padded by a fraction of its side (a finder pattern plus the
+    quiet zone is about a third of a small code), never by less than
+    min_padding cells, and overlapping candidates are merged.
+
+    Frames without candidates can skip the decoder altogether, the others
+    only need their candidate regions decoded. Buffers are reused from
+    frame to frame with reuse_buffer, like FramePreprocessor's.
+    """
+
+    def __init__(self, min_contrast=48, min_density=0.4, cell_size=8, min_cells=2,
+                 padding=0.35, min_padding=2, levels=2, max_coverage=0.5, max_regions=4):
+        """
+        Args:
+            min_contrast: Gray level difference that counts as a strong edge
+            min_density: Share of strong edge pixels that makes a cell dense
+            cell_size: Cell side in pixels at each level
+            min_cells: Smallest candidate side in cells
+            padding: Fraction of a candidate's larger side added on each side
+            min_padding: Fewest cells added on each side
+            levels: Number of scales checked, each half the size of the previous one
+            max_coverage: Decode the whole frame when the candidates cover more of it
+            max_regions: Merge the candidates into one region when there are more
+        """
+        self.min_contrast = min_contrast
+        self.min_density = int(min_density * 255)
+        self.cell_size = cell_size
+        self.min_cells = min_cells
+        self.padding = padding
+        self.min_padding = min_padding
+        self.levels = max(1, levels)
+        self.max_coverage = max_coverage
+        self.max_regions = max_regions
+        self._kernel = np.ones((3, 3), np.uint8)
+        self._buffers = {}
+
+        # Statistics
+        self.frames_checked = 0
+        self.frames_filtered = 0  # No candidate, decoder skipped
+        self.frames_full = 0  # Candidates everywhere, whole frame decoded
+        self.regions_passed = 0
+
+    def _dense_boxes(self, gray, level):
+        """Padded (x0, y0, x1, y1) boxes around the dense blobs of one level, in level pixels"""
+        height, width = gray.shape[:2]
+        cells_w = max(1, width // self.cell_size)
+        cells_h = max(1, height // self.cell_size)
+
+        # Strong edge mask, then its density per cell
+        gradient = reuse_buffer(self._buffers, ('gradient', level), (height, width))
+        cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, self._kernel, dst=gradient)
+        cv2.threshold(gradient, self.min_contrast - 1, 255, cv2.THRESH_BINARY, dst=gradient)
+        cells = reuse_buffer(self._buffers, ('cells', level), (cells_h, cells_w))
+        cv2.resize(gradient, (cells_w, cells_h), dst=cells, interpolation=cv2.INTER_AREA)
+
+        dense = cv2.compare(cells, self.min_density, cv2.CMP_GE)
+        if not cv2.countNonZero(dense):
+            return []
+        # Join cells across flat module interiors and weak corners
+        dense = cv2.morphologyEx(dense, cv2.MORPH_CLOSE, self._kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(dense, connectivity=8)
+
+        sx, sy = width / cells_w, height / cells_h
+        boxes = []
+        for x, y, w, h, _ in stats[1:]:
+            if w < self.min_cells or h < self.min_cells:
+                continue
+            pad = max(self.min_padding, int(np.ceil(self.padding * max(w, h))))
+            boxes.append((int(max(0, x - pad) * sx), int(max(0, y - pad) * sy),
+                          int(min(cells_w, x + w + pad) * sx), int(min(cells_h, y + h + pad) * sy)))
+        return boxes
+
+    @staticmethod
+    def _merge(regions):
+        """Merge overlapping regions until none overlap"""
+        regions = list(regions)
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(regions)):
+                for j in range(i + 1, len(regions)):
+                    a, b = regions[i], regions[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                        del regions[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return regions
+
+    def candidates(self, gray):
+        """
+        Find the regions of a grayscale frame that may hold a QR code
+
+        Returns:
+            List of (x0, y0, x1, y1) regions, empty if the frame can be skipped
+        """
+        height, width = gray.shape[:2]
+        self.frames_checked += 1
+
+        regions = []
+        image, scale = gray, 1
+        for level in range(self.levels):
+            if min(image.shape[:2]) < self.cell_size * self.min_cells * 2:
+                break
+            regions.extend((x0 * scale, y0 * scale, min(width, x1 * scale), min(height, y1 * scale))
+                           for x0, y0, x1, y1 in self._dense_boxes(image, level))
+            if level + 1 < self.levels:
+                smaller = reuse_buffer(self._buffers, ('pyramid', level),
+                                       ((image.shape[0] + 1) // 2, (image.shape[1] + 1) // 2))
+                cv2.pyrDown(image, dst=smaller)
+                image, scale = smaller, scale * 2
+
+        if not regions:
+            self.frames_filtered += 1
+            return []
+        regions = self._merge(regions)
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+        if area > self.max_coverage * width * height:
+            self.frames_full += 1
+            regions = [(0, 0, width, height)]
+        elif len(regions) > self.max_regions:
+            regions = [(min(r[0] for r in regions), min(r[1] for r in regions),
+                        max(r[2] for r in regions), max(r[3] for r in regions))]
+        self.regions_passed += len(regions)
+        return regions
+
+    def stats(self):
+        """Counters as a JSON-serializable dict"""
+        return {
+            'frames_checked': self.frames_checked,
+            'frames_filtered': self.frames_filtered,
+            'frames_full': self.frames_full,
+            'regions_passed': self.regions_passed,
+        }
+
+
+def detect_regions(detector, gray, regions):
+    """
+    Run a detector on each region of a frame
+
+    Only the regions are decoded, never the rest of the frame: the padding
+    keeps whole codes inside them (see check_module_sizes).
+
+    Returns:
+        Detections of every region in frame coordinates, like detector.detect(gray)
+    """
+    results = []
+    for x0, y0, x1, y1 in regions:
+        for data, (x, y, w, h), polygon in detector.detect(gray[y0:y1, x0:x1]):
+            polygon = [(px + x0, py + y0) for px, py in polygon]
+            results.append((data, (x + x0, y + y0, w, h), polygon))
+    return results
+
+
+def check_module_sizes(detector_name="opencv", box_sizes=(2, 3, 4, 6, 8, 10, 12, 14), frames=20,
+                       frame_size=(640, 480), seed=0):
+    """
+    Regression check: codes decoded on the whole frame must also decode from
+    the prefilter's regions, since detect_regions decodes nothing else
+
+    Sharp codes of every module size are placed at random positions on a
+    plain background. Large sharp modules are the hard case: their flat
+    finder patterns and quiet zone are easily left out of a region.
+
+    Returns:
+        Dict of box size -> (frames decoded on the whole frame, frames decoded from the regions)
+    """
+    from generate_qr_code import render_qr_code
+    from qr_detectors import create_detector
+
+    detector = create_detector(detector_name)
+    prefilter = QRPrefilter()
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    results = {}
+    for box_size in box_sizes:
+        code = np.array(render_qr_code(f"WAYPOINT_{box_size}", size=1, border=4, add_text=False,
+                                       box_size=box_size).convert('L'))
+        if code.shape[0] >= height or code.shape[1] >= width:
+            continue
+        full = regions_only = 0
+        for _ in range(frames):
+            frame = np.full((height, width), 150, np.uint8)
+            y = rng.integers(height - code.shape[0])
+            x = rng.integers(width - code.shape[1])
+            frame[y:y + code.shape[0], x:x + code.shape[1]] = code
+            if not detector.detect(frame):
+                continue
+            full += 1
+            if any(detector.detect(frame[y0:y1, x0:x1]) for x0, y0, x1, y1 in prefilter.candidates(frame)):
+                regions_only += 1
+        results[box_size] = (full, regions_only)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the QR prefilter keeps codes of every module size')
+    parser.add_argument('--detector', type=str, default='opencv',
+                        help='QR detector backend')
+    parser.add_argument('--frames', type=int, default=20,
+                        help='Frames per module size')
+    args = parser.parse_args()
+
+    failed = False
+    for box_size, (full, regions_only) in check_module_sizes(args.detector, frames=args.frames).items():
+        ok = regions_only == full
+        failed |= not ok
+        print(f"{box_size:>3} px modules: {regions_only}/{full} decoded from the regions  {'ok' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import time
+
+import cv2
+
+from camera_stream import StreamRecorder
+
+
+def record_stream(camera_url, output_file, duration=None, preview=False):
+    """
+    Record a camera stream with per-frame timestamps for later replay
+
+    Args:
+        camera_url: IP camera URL or webcam index
+        output_file: Output video path (.avi), timestamps go to a .csv next to it
+        duration: Stop after this many seconds (None records until interrupted)
+        preview: Show the frames while recording
+    """
+    print(f"Connecting to camera {camera_url}...")
+    cap = cv2.VideoCapture(camera_url)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video stream from {camera_url}")
+
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    recorder = StreamRecorder(output_file, (width, height), fps)
+
+    print(f"Recording {width}x{height} to {output_file} (Ctrl+C to stop)")
+    start_time = time.time()
+    try:
+        while duration is None or time.time() - start_time < duration:
+            ret, frame = cap.read()
+            if not ret:
+                print("Failed to retrieve frame from camera")
+                break
+            recorder.write(frame, time.time())
+
+            if preview:
+                cv2.imshow("Recording", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        cap.release()
+        if preview:
+            cv2.destroyAllWindows()
+
+    elapsed = time.time() - start_time
+    print(f"Recorded {recorder.frame_count} frames in {elapsed:.1f}s to {output_file}")
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record the robot camera stream for replay')
+    parser.add_argument('--camera', type=str, required=True,
+                        help='IP camera URL or webcam index')
+    parser.add_argument('--output', type=str, default='recording.avi',
+                        help='Output video file (timestamps are saved next to it as .csv)')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Recording length in seconds (default: until Ctrl+C)')
+    parser.add_argument('--preview', action='store_true',
+                        help='Show the stream while recording')
+
+    args = parser.parse_args()
+
+    camera = int(args.camera) if args.camera.isdigit() else args.camera
+    record_stream(camera, args.output, duration=args.duration, preview=args.preview)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+
+
+def load_route(spec):
+    """
+    Parse a route specification
+
+    Args:
+        spec: Path to a text file with one waypoint payload per line (blank
+              lines and lines starting with # are ignored), or a comma
+              separated list of payloads
+
+    Returns:
+        List of waypoint payloads in driving order
+    """
+    if os.path.isfile(spec):
+        with open(spec) as f:
+            lines = [line.strip() for line in f]
+        return [line for line in lines if line and not line.startswith('#')]
+    return [payload.strip() for payload in spec.split(',') if payload.strip()]
+
+
+class Route:
+    """
+    Ordered list of waypoint QR payloads to drive to one after another.
+
+    Decoded payloads are looked up in a dict from payload to its positions
+    in the route, so matching the detections of a frame is one lookup per
+    code no matter how long the route is. Only the current waypoint is
+    steered towards; once its code fills arrive_area of the frame the route
+    advances to the next one.
+    """
+
+    def __init__(self, waypoints, arrive_area=0.15):
+        """
+        Args:
+            waypoints: Payloads in driving order (a payload may appear more than once)
+            arrive_area: QR area / frame area at which a waypoint counts as reached
+        """
+        if not waypoints:
+            raise ValueError("A route needs at least one waypoint")
+        self.waypoints = list(waypoints)
+        self.arrive_area = arrive_area
+
+        self._index = {}
+        for position, payload in enumerate(self.waypoints):
+            self._index.setdefault(payload, set()).add(position)
+
+        self.position = 0
+
+    @property
+    def finished(self):
+        return self.position >= len(self.waypoints)
+
+    @property
+    def current(self):
+        """Payload of the waypoint being driven to, or None once the route is done"""
+        return None if self.finished else self.waypoints[self.position]
+
+    def is_current(self, data):
+        """Whether a decoded payload is the current waypoint"""
+        return self.position in self._index.get(data, ())
+
+    def select(self, decoded_objects):
+        """
+        Pick the detections of the current waypoint
+
+        Args:
+            decoded_objects: List of (data, (x, y, w, h), polygon)
+
+        Returns:
+            The matching detections
+        """
+        return [obj for obj in decoded_objects if self.is_current(obj[0])]
+
+    def check_arrival(self, rect, frame_area):
+        """
+        Advance to the next waypoint if the current one's code is close enough
+
+        Args:
+            rect: (x, y, w, h) of the current waypoint's code
+            frame_area: Area of the processed frame in pixels
+
+        Returns:
+            True if the waypoint was reached
+        """
+        _, _, w, h = rect
+        if self.finished or (w * h) / frame_area < self.arrive_area:
+            return False
+        self.position += 1
+        return True
+
+    def progress(self):
+        """Short progress text, e.g. 'Waypoint 2/5: DOCK'"""
+        if self.finished:
+            return f"Route complete ({len(self.waypoints)} waypoints)"
+        return f"Waypoint {self.position + 1}/{len(self.waypoints)}: {self.current}"
@@ -0,0 +1,228 @@
+import threading
+import time
+
+import serial
+
+# Variable-speed motor frame: header, left speed, right speed, checksum.
+# Speeds in percent (-100..100) are sent in steps of 2% as MOTOR_SPEED_ZERO +
+# percent / 2, and the checksum is 0x80 | ((left + right) % 127). Every byte
+# after the header has the high bit set and is never the header, so a lost
+# byte can't turn the payload into single-character commands ('F', 'S', ...,
+# which still work) or into the start of another frame.
+MOTOR_FRAME_HEADER = 0xFF
+MOTOR_SPEED_ZERO = 0xB2
+
+# Printed by setup() in arduino_controller.ino once the board accepts commands
+ARDUINO_READY_BANNER = b"Arduino ready for commands"
+
+
+def _motor_checksum(left_byte, right_byte):
+    return 0x80 | ((left_byte + right_byte) % 127)
+
+
+def encode_motor_command(left, right):
+    """Build the 4-byte motor frame for left/right speeds in percent (rounded to 2%)"""
+    left_byte = MOTOR_SPEED_ZERO + round(max(-100, min(100, left)) / 2)
+    right_byte = MOTOR_SPEED_ZERO + round(max(-100, min(100, right)) / 2)
+    return bytes([MOTOR_FRAME_HEADER, left_byte, right_byte, _motor_checksum(left_byte, right_byte)])
+
+
+def decode_motor_command(frame):
+    """
+    Read the speeds back from a motor frame, like the Arduino does
+    
+    Returns:
+        (left, right) in percent, or None if the frame is malformed or its checksum is wrong
+    """
+    if len(frame) != 4 or frame[0] != MOTOR_FRAME_HEADER:
+        return None
+    _, left_byte, right_byte, checksum = frame
+    if not 0x80 <= left_byte <= 0xE4 or not 0x80 <= right_byte <= 0xE4:
+        return None
+    if checksum != _motor_checksum(left_byte, right_byte):
+        return None
+    return (left_byte - MOTOR_SPEED_ZERO) * 2, (right_byte - MOTOR_SPEED_ZERO) * 2
+
+
+def wait_for_ready(port, timeout=3.0):
+    """
+    Wait for the Arduino's ready banner after opening the port resets the board
+    
+    Args:
+        port: An open serial.Serial
+        timeout: Give up after this many seconds
+        
+    Returns:
+        True if the banner was seen
+    """
+    received = b""
+    read_timeout = port.timeout
+    port.timeout = 0.05
+    try:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            received += port.read(max(1, port.in_waiting))
+            if ARDUINO_READY_BANNER in received:
+                return True
+        return False
+    finally:
+        port.timeout = read_timeout
+
+
+def describe_command(command):
+    """Human-readable form of a command, e.g. 'S' or 'L+40 R-20'"""
+    if isinstance(command, str):
+        return command
+    speeds = decode_motor_command(command)
+    if speeds is not None:
+        return f"L{speeds[0]:+d} R{speeds[1]:+d}"
+    return command.decode(errors="replace")
+
+
+def _command_bytes(command):
+    return command if isinstance(command, bytes) else command.encode()
+
+
+class SerialCommandWriter:
+    """
+    Send motor commands to the Arduino from a dedicated thread.
+
+    There is a single pending-command slot: a newer command overwrites an
+    older one that has not been written yet, so the vision loop never blocks
+    on the serial port. Writes are paced by min_interval, and the last
+    command is re-sent every keepalive_interval to feed the stop watchdog in
+    arduino_controller.ino.
+    """
+
+    def __init__(self, port, min_interval=0.05, keepalive_interval=0.2, latency=None):
+        """
+        Args:
+            port: An open serial.Serial (or anything with write())
+            min_interval: Minimum time between two writes in seconds
+            keepalive_interval: Re-send the last command after this many idle seconds
+            latency: Optional LatencyTracker for serial_write and glass_to_command
+        """
+        self.port = port
+        self.min_interval = min_interval
+        self.keepalive_interval = keepalive_interval
+        self.latency = latency
+
+        self._lock = threading.Condition()
+        self._pending = None
+        self._pending_frame_time = None
+        self._last_sent = None
+        self._last_write_time = 0.0
+        self._running = True
+
+        # Statistics
+        self.commands_sent = 0
+        self.commands_coalesced = 0
+        self.keepalives_sent = 0
+
+        self._thread = threading.Thread(target=self._write_loop, name="SerialCommandWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, command, frame_time=None):
+        """
+        Queue a command, replacing any command that has not been sent yet
+        
+        Args:
+            command: Single-character command or encoded motor frame (bytes)
+            frame_time: Capture time (time.time()) of the frame the command was
+                        computed from, for glass-to-command latency
+        """
+        with self._lock:
+            if self._pending is not None:
+                self.commands_coalesced += 1
+            self._pending = command
+            self._pending_frame_time = frame_time
+            self._lock.notify()
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while self._running:
+                    now = time.time()
+                    next_write = self._last_write_time + self.min_interval
+                    if self._pending is not None and now >= next_write:
+                        break
+                    keepalive_due = self._last_write_time + self.keepalive_interval
+                    if self._pending is None and self._last_sent is not None and now >= keepalive_due:
+                        break
+
+                    # Sleep until the next write is allowed or a keep-alive is due
+                    if self._pending is not None:
+                        wake = next_write
+                    elif self._last_sent is not None:
+                        wake = keepalive_due
+                    else:
+                        wake = None
+                    self._lock.wait(timeout=None if wake is None else max(0.001, wake - now))
+
+                if not self._running and self._pending is None:
+                    return
+
+                if self._pending is not None:
+                    command = self._pending
+                    frame_time = self._pending_frame_time
+                    self._pending = None
+                    keepalive = False
+                else:
+                    command = self._last_sent
+                    frame_time = None
+                    keepalive = True
+
+            start = time.perf_counter()
+            try:
+                self.port.write(_command_bytes(command))
+            except (serial.SerialException, OSError) as e:
+                print(f"Warning: Serial write failed: {e}")
+            if self.latency is not None:
+                self.latency.record('serial_write', time.perf_counter() - start)
+                if frame_time is not None:
+                    self.latency.record('glass_to_command', time.time() - frame_time)
+
+            with self._lock:
+                self._last_sent = command
+                self._last_write_time = time.time()
+                if keepalive:
+                    self.keepalives_sent += 1
+                else:
+                    self.commands_sent += 1
+
+    def close(self, timeout=1.0):
+        """Flush the pending command and stop the writer thread"""
+        with self._lock:
+            self._running = False
+            self._lock.notify()
+        self._thread.join(timeout=timeout)
+
+
+class FakeSerial:
+    """
+    Stand-in for serial.Serial that records every write with its timestamp,
+    for running the navigation pipeline without an Arduino attached.
+    """
+
+    def __init__(self):
+        self.writes = []
+        self.is_open = True
+
+    def write(self, data):
+        self.writes.append((time.time(), bytes(data)))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    def commands(self):
+        """Written commands as (timestamp, command), with repeated keep-alives collapsed"""
+        sequence = []
+        for timestamp, data in self.writes:
+            command = describe_command(data)
+            if not sequence or sequence[-1][1] != command:
+                sequence.append((timestamp, command))
+        return sequence
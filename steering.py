@@ -0,0 +1,98 @@
+import time
+
+
+class PIDController:
+    """Textbook PID controller with output and integral clamping"""
+
+    def __init__(self, kp, ki=0.0, kd=0.0, output_limit=None, integral_limit=None):
+        """
+        Args:
+            kp, ki, kd: Proportional, integral and derivative gains
+            output_limit: Clamp the output to [-output_limit, output_limit]
+            integral_limit: Clamp the integral term to avoid wind-up
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self):
+        self._integral = 0.0
+        self._last_error = None
+        self._last_time = None
+
+    def update(self, error, now=None):
+        """Feed a new error value and get the control output"""
+        now = time.time() if now is None else now
+        derivative = 0.0
+        if self._last_time is not None:
+            dt = now - self._last_time
+            if dt > 0:
+                self._integral += error * dt
+                if self.integral_limit is not None:
+                    self._integral = _clamp(self._integral, self.integral_limit)
+                derivative = (error - self._last_error) / dt
+        self._last_error = error
+        self._last_time = now
+
+        output = self.kp * error + self.ki * self._integral + self.kd * derivative
+        if self.output_limit is not None:
+            output = _clamp(output, self.output_limit)
+        return output
+
+
+class SteeringController:
+    """
+    Turn the QR code position into left/right motor speeds.
+
+    A PID loop on the normalized horizontal offset sets the turn rate. The
+    forward speed falls as the code fills more of the frame (a distance
+    proxy) and as the offset grows, so the robot turns in place when the
+    target is far off-center and slows down on arrival.
+    """
+
+    def __init__(self, max_speed=70, kp=60.0, ki=5.0, kd=8.0, arrive_area=0.2, speed_step=5):
+        """
+        Args:
+            max_speed: Highest motor speed in percent (0-100)
+            kp, ki, kd: PID gains on the offset, normalized to -1..1
+            arrive_area: QR area / frame area at which the robot stops driving forward
+            speed_step: Speeds are rounded to this step so small changes don't resend commands
+        """
+        self.max_speed = max_speed
+        self.arrive_area = arrive_area
+        self.speed_step = max(1, speed_step)
+        self.pid = PIDController(kp, ki, kd, output_limit=max_speed, integral_limit=0.5)
+
+    def reset(self):
+        """Forget the controller state, e.g. when the target is lost"""
+        self.pid.reset()
+
+    def update(self, offset, area, now=None):
+        """
+        Args:
+            offset: Horizontal offset of the target, -1 (far left) to 1 (far right)
+            area: Target area as a fraction of the frame area
+
+        Returns:
+            (left, right) motor speeds in percent, -100 to 100
+        """
+        turn = self.pid.update(offset, now)
+
+        # Slow down as the target gets close or far off-center
+        closeness = min(1.0, area / self.arrive_area)
+        forward = self.max_speed * (1.0 - closeness) * max(0.0, 1.0 - abs(offset))
+
+        left = self._quantize(forward + turn)
+        right = self._quantize(forward - turn)
+        return left, right
+
+    def _quantize(self, speed):
+        speed = _clamp(speed, 100)
+        return int(round(speed / self.speed_step) * self.speed_step)
+
+
+def _clamp(value, limit):
+    return max(-limit, min(limit, value))
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from generate_qr_code import render_qr_code
+
+ANNOTATIONS_FILE = "annotations.json"
+
+# Default ranges the augmentations are drawn from
+DEFAULT_OPTIONS = {
+    'image_size': (1280, 720),
+    'codes_per_image': (1, 2),
+    'code_size': (40, 360),  # Side of the code in pixels
+    'rotation': 45.0,  # Max in-plane rotation in degrees
+    'perspective': 0.15,  # Max corner displacement as a fraction of the code size
+    'blur': 2.0,  # Max Gaussian blur sigma
+    'motion_blur': 9,  # Max motion blur kernel length
+    'noise': 12.0,  # Max Gaussian noise sigma
+    'gain': (0.5, 1.3),  # Brightness gain range
+    'gradient': 0.4,  # Max brightness change across the image (uneven lighting)
+}
+
+
+def _background(rng, size, backgrounds):
+    """Random crop of a background image, or a cluttered synthetic background"""
+    width, height = size
+    if backgrounds:
+        image = cv2.imread(backgrounds[rng.integers(len(backgrounds))])
+        if image is not None:
+            scale = max(width / image.shape[1], height / image.shape[0])
+            if scale > 1:
+                image = cv2.resize(image, None, fx=scale, fy=scale)
+            y = rng.integers(image.shape[0] - height + 1)
+            x = rng.integers(image.shape[1] - width + 1)
+            return image[y:y + height, x:x + width].copy()
+
+    # Smooth color noise with a few rectangles and lines as clutter
+    small = rng.integers(0, 256, (height // 40 + 2, width // 40 + 2, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(rng.integers(3, 10)):
+        p0 = (int(rng.integers(width)), int(rng.integers(height)))
+        p1 = (int(rng.integers(width)), int(rng.integers(height)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        if rng.random() < 0.5:
+            cv2.rectangle(image, p0, p1, color, -1)
+        else:
+            cv2.line(image, p0, p1, color, int(rng.integers(1, 6)))
+    return image
+
+
+def _place_code(rng, image, data, options, taken):
+    """
+    Warp a rendered code onto the image at a random pose
+
+    Returns:
+        Corner polygon of the code (quiet zone excluded), or None if it did not fit
+    """
+    height, width = image.shape[:2]
+    border = 4
+    code = np.array(render_qr_code(data, size=1, border=border, add_text=False, box_size=8).convert('L'))
+    modules = code.shape[0] // 8
+
+    side = rng.uniform(*options['code_size'])
+    scale = side / ((modules - 2 * border) * 8)
+    # Corners of the whole rendered image and of the code inside the quiet zone
+    inner = border * 8
+    outer_pts = np.float32([[0, 0], [code.shape[1], 0], [code.shape[1], code.shape[0]], [0, code.shape[0]]])
+    code_pts = np.float32([[inner, inner], [code.shape[1] - inner, inner],
+                           [code.shape[1] - inner, code.shape[0] - inner], [inner, code.shape[0] - inner]])
+
+    # Rotate and scale around the center, then jitter the corners for perspective
+    center = np.float32([code.shape[1], code.shape[0]]) / 2
+    angle = np.deg2rad(rng.uniform(-options['rotation'], options['rotation']))
+    rotation = np.float32([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    dst = (outer_pts - center) @ rotation.T * scale
+    dst += rng.uniform(-1, 1, dst.shape).astype(np.float32) * options['perspective'] * side
+
+    # Random position that keeps the code inside the image and off the other codes
+    for _ in range(20):
+        offset = np.float32([rng.uniform(0, width), rng.uniform(0, height)])
+        placed = dst + offset
+        x0, y0 = placed.min(axis=0)
+        x1, y1 = placed.max(axis=0)
+        if x0 < 0 or y0 < 0 or x1 >= width or y1 >= height:
+            continue
+        if any(x0 < bx1 and bx0 < x1 and y0 < by1 and by0 < y1 for bx0, by0, bx1, by1 in taken):
+            continue
+        break
+    else:
+        return None
+    taken.append((x0, y0, x1, y1))
+
+    # Warp into the bounding box only and blend there
+    bx0, by0 = int(x0), int(y0)
+    bx1, by1 = min(width, int(np.ceil(x1)) + 1), min(height, int(np.ceil(y1)) + 1)
+    box_size = (bx1 - bx0, by1 - by0)
+    matrix = cv2.getPerspectiveTransform(outer_pts, placed - np.float32([bx0, by0]))
+    warped = cv2.warpPerspective(code, matrix, box_size, flags=cv2.INTER_AREA)
+    mask = cv2.warpPerspective(np.full_like(code, 255), matrix, box_size, flags=cv2.INTER_LINEAR)
+
+    alpha = (mask.astype(np.float32) / 255)[..., None]
+    region = image[by0:by1, bx0:bx1]
+    region[:] = (region * (1 - alpha) + warped[..., None] * alpha).astype(np.uint8)
+
+    polygon = cv2.perspectiveTransform(code_pts[None], matrix)[0] + np.float32([bx0, by0])
+    return [[round(float(x), 2), round(float(y), 2)] for x, y in polygon]
+
+
+def _degrade(rng, image, options):
+    """Apply blur, uneven lighting and sensor noise"""
+    params = {}
+
+    sigma = rng.uniform(0, options['blur'])
+    if sigma > 0.3:
+        image = cv2.GaussianBlur(image, (0, 0), sigma)
+    params['blur'] = round(sigma, 2)
+
+    length = int(rng.integers(0, options['motion_blur'] + 1))
+    if length > 1:
+        kernel = np.zeros((length, length), np.float32)
+        kernel[length // 2, :] = 1.0 / length
+        rotation = cv2.getRotationMatrix2D((length / 2 - 0.5, length / 2 - 0.5), rng.uniform(0, 180), 1.0)
+        kernel = cv2.warpAffine(kernel, rotation, (length, length))
+        image = cv2.filter2D(image, -1, kernel / max(kernel.sum(), 1e-6))
+    params['motion_blur'] = length
+
+    height, width = image.shape[:2]
+    gain = rng.uniform(*options['gain'])
+    gradient = rng.uniform(-options['gradient'], options['gradient'])
+    ramp = 1 + gradient * np.linspace(-0.5, 0.5, width, dtype=np.float32)
+    if rng.random() < 0.5:
+        ramp = 1 + gradient * np.linspace(-0.5, 0.5, height, dtype=np.float32)[:, None]
+    lighting = (gain * ramp)[..., None]
+    params['gain'] = round(gain, 3)
+    params['gradient'] = round(gradient, 3)
+
+    noise = rng.uniform(0, options['noise'])
+    image = image.astype(np.float32)
+    image *= lighting
+    image += rng.standard_normal(image.shape, dtype=np.float32) * np.float32(noise)
+    params['noise'] = round(noise, 2)
+
+    return np.clip(image, 0, 255).astype(np.uint8), params
+
+
+def _generate_image(task):
+    """Worker: build one image and its annotation"""
+    index, seed, output_dir, backgrounds, options, payload_prefix = task
+    rng = np.random.default_rng([seed, index])
+
+    image = _background(rng, options['image_size'], backgrounds)
+    codes = []
+    taken = []
+    low, high = options['codes_per_image']
+    for i in range(rng.integers(low, high + 1)):
+        data = f"{payload_prefix}{index:05d}_{i}"
+        polygon = _place_code(rng, image, data, options, taken)
+        if polygon is not None:
+            codes.append({'data': data, 'polygon': polygon})
+
+    image, params = _degrade(rng, image, options)
+    file_name = f"{index:05d}.png"
+    cv2.imwrite(os.path.join(output_dir, file_name), image)
+    return {'file': file_name, 'codes': codes, 'params': params}
+
+
+def generate_dataset(output_dir, count, seed=0, backgrounds_dir=None, workers=None,
+                     payload_prefix="QR", **options):
+    """
+    Generate synthetic QR images with ground truth on a pool of processes
+
+    Args:
+        output_dir: Directory for the images and annotations.json
+        count: Number of images
+        seed: Random seed, the same seed gives the same dataset
+        backgrounds_dir: Optional directory of background photos
+        workers: Number of processes (default: one per CPU)
+        payload_prefix: Payloads are <prefix><image>_<code>
+        options: Overrides for DEFAULT_OPTIONS
+
+    Returns:
+        Path of the annotation file
+    """
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+    options = {**DEFAULT_OPTIONS, **options}
+
+    backgrounds = []
+    if backgrounds_dir:
+        backgrounds = sorted(os.path.join(backgrounds_dir, name) for name in os.listdir(backgrounds_dir)
+                             if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')))
+
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(i, seed, output_dir, backgrounds, options, payload_prefix) for i in range(count)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        images = list(pool.map(_generate_image, tasks, chunksize=max(1, count // 64)))
+
+    annotations_path = os.path.join(output_dir, ANNOTATIONS_FILE)
+    with open(annotations_path, 'w') as f:
+        json.dump({'seed': seed, 'options': options, 'images': images}, f, indent=1)
+
+    codes = sum(len(image['codes']) for image in images)
+    print(f"{count} images with {codes} QR codes saved to {output_dir}")
+    return annotations_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic QR detection dataset with ground truth')
+    parser.add_argument('--output', type=str, default='qr_dataset',
+                        help='Output directory')
+    parser.add_argument('--count', type=int, default=500,
+                        help='Number of images')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed')
+    parser.add_argument('--backgrounds', type=str, default=None,
+                        help='Directory of background photos (default: synthetic clutter)')
+    parser.add_argument('--width', type=int, default=1280,
+                        help='Image width')
+    parser.add_argument('--height', type=int, default=720,
+                        help='Image height')
+    parser.add_argument('--min-code-size', type=int, default=40,
+                        help='Smallest code side in pixels')
+    parser.add_argument('--max-code-size', type=int, default=360,
+                        help='Largest code side in pixels')
+    parser.add_argument('--rotation', type=float, default=45.0,
+                        help='Max in-plane rotation in degrees')
+    parser.add_argument('--perspective', type=float, default=0.15,
+                        help='Max corner displacement as a fraction of the code size')
+    parser.add_argument('--blur', type=float, default=2.0,
+                        help='Max Gaussian blur sigma')
+    parser.add_argument('--motion-blur', type=int, default=9,
+                        help='Max motion blur length in pixels')
+    parser.add_argument('--noise', type=float, default=12.0,
+                        help='Max noise sigma')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: one per CPU)')
+
+    args = parser.parse_args()
+
+    generate_dataset(
+        args.output,
+        args.count,
+        seed=args.seed,
+        backgrounds_dir=args.backgrounds,
+        workers=args.workers,
+        image_size=(args.width, args.height),
+        code_size=(args.min_code_size, args.max_code_size),
+        rotation=args.rotation,
+        perspective=args.perspective,
+        blur=args.blur,
+        motion_blur=args.motion_blur,
+        noise=args.noise
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+
+class TargetTracker:
+    """
+    Constant-velocity Kalman filter on the QR code center and size.
+
+    The filter is corrected with every decoded bounding box and predicts
+    where the code is between decodes, so navigation can keep going on
+    skipped frames and through a few missed decodes (e.g. motion blur).
+    """
+
+    def __init__(self, max_missed=5, process_noise=50.0, measurement_noise=4.0):
+        """
+        Args:
+            max_missed: Consecutive missed decodes to bridge before the target is lost
+            process_noise: How quickly the target may change velocity (px/s^2 scale)
+            measurement_noise: Expected jitter of decoded boxes in pixels
+        """
+        self.max_missed = max_missed
+        self.process_noise = process_noise
+
+        # State: cx, cy, w, h, vx, vy  Measurement: cx, cy, w, h
+        self.kf = cv2.KalmanFilter(6, 4)
+        self.kf.measurementMatrix = np.eye(4, 6, dtype=np.float32)
+        self.kf.measurementNoiseCov = np.eye(4, dtype=np.float32) * measurement_noise ** 2
+        self.reset()
+
+    def reset(self):
+        self.initialized = False
+        self.missed = 0
+        self._last_time = None
+
+    def _advance(self, now):
+        """Predict the state forward to time now"""
+        dt = max(0.0, now - self._last_time)
+        self._last_time = now
+
+        transition = np.eye(6, dtype=np.float32)
+        transition[0, 4] = dt
+        transition[1, 5] = dt
+        self.kf.transitionMatrix = transition
+
+        noise = np.diag([dt ** 2, dt ** 2, dt ** 2, dt ** 2, dt, dt]).astype(np.float32)
+        self.kf.processNoiseCov = noise * self.process_noise ** 2
+        return self.kf.predict()
+
+    def update(self, rect, now):
+        """
+        Correct the filter with a decoded bounding box
+
+        Args:
+            rect: (x, y, w, h) of the tracked QR code
+            now: Capture time of the frame in seconds
+        """
+        x, y, w, h = rect
+        measurement = np.array([[x + w / 2], [y + h / 2], [w], [h]], dtype=np.float32)
+
+        if not self.initialized:
+            self.kf.statePost = np.vstack([measurement, np.zeros((2, 1), np.float32)])
+            self.kf.errorCovPost = np.diag([10, 10, 10, 10, 1000, 1000]).astype(np.float32)
+            self._last_time = now
+            self.initialized = True
+        else:
+            self._advance(now)
+            self.kf.correct(measurement)
+        self.missed = 0
+
+    def predict(self, now, missed=False):
+        """
+        Estimate the bounding box at time now
+
+        Args:
+            now: Time of the frame to predict for
+            missed: True if a decode ran on this frame and found nothing
+
+        Returns:
+            Predicted (x, y, w, h), or None if there is no target to track
+        """
+        if not self.initialized:
+            return None
+        if missed:
+            self.missed += 1
+            if self.missed > self.max_missed:
+                self.reset()
+                return None
+
+        cx, cy, w, h = (float(v) for v in self._advance(now)[:4, 0])
+        w, h = max(1.0, w), max(1.0, h)
+        return int(cx - w / 2), int(cy - h / 2), int(w), int(h)
+
+    def scale(self, factor):
+        """Rescale the tracked state after the processing resolution changed"""
+        if self.initialized:
+            self.kf.statePost = self.kf.statePost * np.float32(factor)
+            self.kf.statePre = self.kf.statePre * np.float32(factor)
@@ -0,0 +1,272 @@
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+_INDEX_PAGE = b"""<!DOCTYPE html>
+<html><head><title>QR Navigation</title></head>
+<body style="font-family: monospace">
+<img src="/video.mjpg" style="float: left; margin-right: 1em">
+<pre id="state">connecting...</pre>
+<script>
+const ws = new WebSocket(`ws://${location.host}/ws`);
+ws.onmessage = (event) => {
+  document.getElementById('state').textContent = JSON.stringify(JSON.parse(event.data), null, 2);
+};
+ws.onclose = () => { document.getElementById('state').textContent += '\\n(disconnected)'; };
+</script>
+</body></html>
+"""
+_VIDEO_TAG = b'<img src="/video.mjpg" style="float: left; margin-right: 1em">\n'
+
+
+class TelemetryServer:
+    """
+    Serve robot state and annotated video over HTTP, on its own threads.
+
+    GET /state returns the state as JSON, /ws pushes it over a WebSocket and
+    /video.mjpg streams the annotated frames as MJPEG (/frame.jpg is the
+    latest one). State comes from state_provider, called at most every
+    state_interval seconds and only while someone is asking for it.
+
+    publish_frame() is all the control loop has to call: it drops frames
+    above the stream rate and shrinks the rest into a new array (so the
+    robot's reused display buffer can be overwritten right away). JPEG
+    encoding happens on the encoder thread and every client is served from
+    its own thread with the newest JPEG, so a slow client only misses
+    frames instead of holding anything up.
+    """
+
+    def __init__(self, state_provider, host="0.0.0.0", port=8090, state_interval=0.2,
+                 stream_fps=5.0, stream_width=320, jpeg_quality=70):
+        """
+        Args:
+            state_provider: Function returning the current state as a JSON-serializable dict
+            host, port: Address to listen on
+            state_interval: Seconds between state updates
+            stream_fps: Maximum MJPEG frame rate, 0 to serve the state only
+            stream_width: Width of the streamed frames
+            jpeg_quality: JPEG quality (0-100)
+        """
+        self.state_provider = state_provider
+        self.state_interval = state_interval
+        self.streaming = stream_fps > 0
+        self.stream_interval = 1.0 / stream_fps if self.streaming else float('inf')
+        self.index_page = _INDEX_PAGE if self.streaming else _INDEX_PAGE.replace(_VIDEO_TAG, b'')
+        self.stream_width = stream_width
+        self.jpeg_quality = jpeg_quality
+
+        self._state_lock = threading.Lock()
+        self._state = None
+        self._state_time = 0.0
+
+        self._frame_lock = threading.Condition()
+        self._raw_frame = None
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._last_publish = 0.0
+        self._last_frame_request = 0.0
+        self._running = False
+
+        # Statistics
+        self.frames_encoded = 0
+        self.clients = 0
+
+        self._httpd = ThreadingHTTPServer((host, port), _TelemetryHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.telemetry = self
+        self._threads = []
+
+    @property
+    def address(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        """Start the HTTP and encoder threads"""
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._httpd.serve_forever, name="TelemetryHTTP", daemon=True),
+            threading.Thread(target=self._encode_loop, name="TelemetryEncoder", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"Telemetry at {self.address}")
+        return self
+
+    def stop(self):
+        with self._frame_lock:
+            self._running = False
+            self._frame_lock.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def frame_due(self):
+        """Whether publish_frame() would take a frame now (checked before annotating one)"""
+        now = time.time()
+        # Frames are only made while someone watches the stream or polls /frame.jpg
+        wanted = self.clients > 0 or now - self._last_frame_request < 5.0
+        return wanted and now - self._last_publish >= self.stream_interval
+
+    def publish_frame(self, frame):
+        """Offer an annotated frame for streaming, dropped if it comes too soon after the last one"""
+        if not self.frame_due():
+            return
+        self._last_publish = time.time()
+        height = max(1, int(frame.shape[0] * self.stream_width / frame.shape[1]))
+        small = cv2.resize(frame, (self.stream_width, height), interpolation=cv2.INTER_AREA)
+        with self._frame_lock:
+            self._raw_frame = small
+            self._frame_lock.notify_all()
+
+    def _encode_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            with self._frame_lock:
+                while self._running and self._raw_frame is None:
+                    self._frame_lock.wait()
+                if not self._running:
+                    return
+                frame, self._raw_frame = self._raw_frame, None
+
+            ok, jpeg = cv2.imencode('.jpg', frame, params)
+            if not ok:
+                continue
+            with self._frame_lock:
+                self._jpeg = jpeg.tobytes()
+                self._jpeg_seq += 1
+                self.frames_encoded += 1
+                self._frame_lock.notify_all()
+
+    def add_client(self, count):
+        with self._frame_lock:
+            self.clients += count
+
+    def wait_jpeg(self, last_seq, timeout=1.0):
+        """
+        Wait for a JPEG newer than last_seq
+
+        Returns:
+            (jpeg bytes, seq), or (None, last_seq) on timeout or shutdown
+        """
+        with self._frame_lock:
+            self._frame_lock.wait_for(lambda: not self._running or self._jpeg_seq > last_seq, timeout)
+            if not self._running or self._jpeg_seq <= last_seq:
+                return None, last_seq
+            return self._jpeg, self._jpeg_seq
+
+    def latest_jpeg(self):
+        self._last_frame_request = time.time()
+        with self._frame_lock:
+            return self._jpeg
+
+    def state(self):
+        """Latest state, refreshed from the provider at most every state_interval"""
+        with self._state_lock:
+            now = time.time()
+            if self._state is None or now - self._state_time >= self.state_interval:
+                self._state = self.state_provider()
+                self._state_time = now
+            return self._state
+
+    @property
+    def running(self):
+        return self._running
+
+
+class _TelemetryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep the console for the robot
+
+    def do_GET(self):
+        telemetry = self.server.telemetry
+        path = self.path.split('?')[0]
+        if path == '/':
+            self._send(200, 'text/html', telemetry.index_page)
+        elif path == '/state':
+            self._send(200, 'application/json', json.dumps(telemetry.state()).encode())
+        elif path in ('/frame.jpg', '/video.mjpg') and not telemetry.streaming:
+            self._send(404, 'text/plain', b'Video streaming is disabled\n')
+        elif path == '/frame.jpg':
+            jpeg = telemetry.latest_jpeg()
+            if jpeg is None:
+                self._send(404, 'text/plain', b'No frame yet\n')
+            else:
+                self._send(200, 'image/jpeg', jpeg)
+        elif path == '/video.mjpg':
+            self._stream_mjpeg(telemetry)
+        elif path == '/ws':
+            self._stream_websocket(telemetry)
+        else:
+            self._send(404, 'text/plain', b'Not found\n')
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_mjpeg(self, telemetry):
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        telemetry.add_client(1)
+        seq = 0
+        try:
+            while telemetry.running:
+                jpeg, seq = telemetry.wait_jpeg(seq)
+                if jpeg is None:
+                    continue
+                self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n'
+                                 b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            telemetry.add_client(-1)
+
+    def _stream_websocket(self, telemetry):
+        """Push the state as WebSocket text frames (messages from the client are ignored)"""
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not key or self.headers.get('Upgrade', '').lower() != 'websocket':
+            self._send(400, 'text/plain', b'Expected a WebSocket upgrade\n')
+            return
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            while telemetry.running:
+                payload = json.dumps(telemetry.state()).encode()
+                if len(payload) < 126:
+                    header = struct.pack('!BB', 0x81, len(payload))
+                elif len(payload) < 65536:
+                    header = struct.pack('!BBH', 0x81, 126, len(payload))
+                else:
+                    header = struct.pack('!BBQ', 0x81, 127, len(payload))
+                self.wfile.write(header + payload)
+                self.wfile.flush()
+                time.sleep(telemetry.state_interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
@@ -0,0 +1,44 @@
+from adaptive_control import AdaptiveController
+
+
+def test_width_shrinks_for_large_codes():
+    controller = AdaptiveController(640, cooldown=0)
+    width, _ = controller.update(0.01, 200)
+    assert width == 512
+    # Never below min_width
+    for _ in range(20):
+        width, _ = controller.update(0.01, 200)
+    assert width == controller.min_width
+
+
+def test_width_grows_after_misses():
+    controller = AdaptiveController(640, miss_limit=3, cooldown=0)
+    assert controller.update(0.01, None)[0] == 640
+    assert controller.update(0.01, None)[0] == 640
+    assert controller.update(0.01, None)[0] == 800
+    for _ in range(30):
+        width, _ = controller.update(0.01, None)
+    assert width == controller.max_width
+
+
+def test_unchanged_width_is_not_rounded():
+    controller = AdaptiveController(650, cooldown=0)
+    assert controller.update(0.01, 100)[0] == 650
+
+
+def test_width_changes_wait_for_cooldown():
+    controller = AdaptiveController(640, cooldown=3)
+    assert controller.update(0.01, 200)[0] == 512
+    assert controller.update(0.01, 200)[0] == 512
+    assert controller.update(0.01, 200)[0] == 512
+    assert controller.update(0.01, 200)[0] == 400
+
+
+def test_skip_frames_follow_latency_budget():
+    controller = AdaptiveController(640, latency_budget=0.05, max_skip=3, cooldown=0)
+    for _ in range(10):
+        _, skip = controller.update(0.2, 100)
+    assert skip == 3
+    for _ in range(50):
+        _, skip = controller.update(0.001, 100)
+    assert skip == 1
@@ -0,0 +1,27 @@
+import asyncio
+
+from async_runtime import DropOldestQueue
+
+
+def test_drop_oldest_queue_keeps_newest():
+    async def scenario():
+        queue = DropOldestQueue(maxsize=2)
+        assert not queue.put_nowait(1)
+        assert not queue.put_nowait(2)
+        assert queue.put_nowait(3)
+        assert queue.put_nowait(4)
+        assert queue.dropped == 2
+        return [await queue.get(), await queue.get()]
+
+    assert asyncio.run(scenario()) == [3, 4]
+
+
+def test_drop_oldest_queue_wakes_consumer():
+    async def scenario():
+        queue = DropOldestQueue()
+        consumer = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0)
+        queue.put_nowait('frame')
+        return await asyncio.wait_for(consumer, timeout=1.0)
+
+    assert asyncio.run(scenario()) == 'frame'
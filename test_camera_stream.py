@@ -0,0 +1,86 @@
+import threading
+import time
+
+import numpy as np
+
+from camera_stream import FrameGrabber
+
+
+class FakeCapture:
+    """Capture that returns a fixed number of frames, then fails every read"""
+
+    def __init__(self, frames, value=0):
+        self.frames = frames
+        self.value = value
+        self.released = False
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return False
+
+    def read(self, image=None):
+        if self.frames <= 0:
+            return False, None
+        self.frames -= 1
+        time.sleep(0.005)
+        return True, np.full((4, 4), self.value, dtype=np.uint8)
+
+    def release(self):
+        self.released = True
+
+
+def read_frame(grabber):
+    deadline = time.time() + 2.0
+    while time.time() < deadline:
+        ret, frame, _ = grabber.read(timeout=0.5)
+        if ret:
+            return frame
+    raise AssertionError("no frame from the grabber")
+
+
+def test_grabber_fails_without_reopen():
+    grabber = FrameGrabber(FakeCapture(1)).start()
+    read_frame(grabber)
+    ret, frame, frame_time = grabber.read(timeout=1.0)
+    assert (ret, frame, frame_time) == (False, None, None)
+    assert grabber.failed
+    grabber.stop()
+
+
+def test_grabber_reconnects_with_backoff():
+    first = FakeCapture(1, value=1)
+    second = FakeCapture(1000, value=2)
+    stream_back = threading.Event()
+    attempts = []
+
+    def reopen():
+        attempts.append(time.time())
+        return second if stream_back.is_set() else None
+
+    grabber = FrameGrabber(first, reopen=reopen, backoff_initial=0.05, backoff_max=0.1).start()
+    assert read_frame(grabber)[0, 0] == 1
+
+    # The consumer is told about the outage instead of blocking
+    ret, _, _ = grabber.read(timeout=0.3)
+    assert not ret
+    assert not grabber.connected and not grabber.failed
+    assert first.released
+    assert len(attempts) >= 2
+    assert all(b - a >= 0.04 for a, b in zip(attempts, attempts[1:]))
+
+    stream_back.set()
+    assert read_frame(grabber)[0, 0] == 2
+    assert grabber.connected
+    assert grabber.reconnects == 1
+    assert grabber.downtime >= 0.3
+    grabber.stop()
+
+
+def test_stop_interrupts_backoff():
+    grabber = FrameGrabber(FakeCapture(0), reopen=lambda: None, backoff_initial=10.0).start()
+    time.sleep(0.05)
+    start = time.time()
+    grabber.stop()
+    assert time.time() - start < 1.0
@@ -0,0 +1,31 @@
+import cv2
+import numpy as np
+
+from frame_preprocess import FramePreprocessor, reuse_buffer
+
+
+def test_reuse_buffer_keeps_matching_shape():
+    buffers = {}
+    first = reuse_buffer(buffers, 'gray', (4, 6))
+    assert reuse_buffer(buffers, 'gray', (4, 6)) is first
+    assert reuse_buffer(buffers, 'gray', (6, 4)) is not first
+
+
+def test_gray_matches_cvtcolor_and_reuses_buffers():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    preprocessor = FramePreprocessor(320, 240)
+
+    gray = preprocessor.gray(frame)
+    expected = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (320, 240),
+                          interpolation=cv2.INTER_AREA)
+    assert gray.shape == (240, 320)
+    assert np.array_equal(gray, expected)
+    assert preprocessor.gray(frame) is gray
+
+    color = preprocessor.color(frame)
+    assert color.shape == (240, 320, 3)
+    assert preprocessor.color(frame) is color
+
+    preprocessor.set_size(160, 120)
+    assert preprocessor.gray(frame).shape == (120, 160)
@@ -1,6 +1,16 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
 import cv2
 import numpy as np
-import os
+from qr_detectors import available_detectors, create_detector
+from qr_prefilter import QRPrefilter, detect_regions
+
+VIDEO_EXTENSIONS = ('.avi', '.mp4', '.mkv', '.mov')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
 
 def get_user_input():
     """Get camera URL from user input"""
@@ -20,7 +30,235 @@ def get_user_input():
     
     return camera_url
 
-def main():
+def iter_frames(path, max_frames=None):
+    """
+    Yield the frames of every clip and image in a directory, in name order
+    
+    Args:
+        path: Directory of clips (e.g. from record_stream.py) and images, or a single file
+        max_frames: Only take the first N frames of each clip
+        
+    Yields:
+        (file name, frame)
+    """
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        files = [path]
+    
+    for file in files:
+        name = os.path.basename(file)
+        ext = os.path.splitext(file)[1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            frame = cv2.imread(file)
+            if frame is None:
+                print(f"Warning: could not read {name}, skipping")
+                continue
+            yield name, frame
+        elif ext in VIDEO_EXTENSIONS:
+            cap = cv2.VideoCapture(file)
+            count = 0
+            while max_frames is None or count < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                count += 1
+                yield name, frame
+            cap.release()
+
+def _prefiltered(detector):
+    """Detect function that only decodes the regions passed by a QR prefilter"""
+    prefilter = QRPrefilter()
+    return lambda gray: detect_regions(detector, gray, prefilter.candidates(gray))
+
+def benchmark_methods(path, methods=None, width=640, max_frames=None, prefilter=False):
+    """
+    Run every detection method over recorded clips and images
+    
+    Frames get the same preprocessing as the live viewer: shrunk to at most
+    width pixels and converted to grayscale. Only the detector call is timed.
+    
+    Args:
+        path: Directory of clips and images, or a single file
+        methods: Detector names (default: every available one)
+        width: Largest processing width
+        max_frames: Only take the first N frames of each clip
+        prefilter: Also time each method behind the QR prefilter, as <name>+prefilter
+        
+    Returns:
+        Dict of method name -> results (frames, detection rate, ms/frame p50/p95)
+    """
+    runners = {}
+    for name in methods or available_detectors():
+        detector = create_detector(name)
+        runners[name] = detector.detect
+        if prefilter:
+            runners[f"{name}+prefilter"] = _prefiltered(detector)
+    
+    times = {name: [] for name in runners}
+    detected = {name: 0 for name in runners}
+    files = set()
+    warmed_up = False
+    
+    for file, frame in iter_frames(path, max_frames):
+        files.add(file)
+        height, frame_width = frame.shape[:2]
+        if frame_width > width:
+            frame = cv2.resize(frame, (width, int(height * width / frame_width)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        
+        if not warmed_up:
+            # Keep one-time setup inside the backends out of the timings
+            for run in runners.values():
+                run(gray)
+            warmed_up = True
+        
+        for name, run in runners.items():
+            start = time.perf_counter()
+            detections = run(gray)
+            times[name].append(time.perf_counter() - start)
+            if detections:
+                detected[name] += 1
+    
+    if not files:
+        raise ValueError(f"No clips or images found in {path}")
+    
+    results = {}
+    for name in runners:
+        ms = np.array(times[name]) * 1000
+        results[name] = {
+            'frames': len(ms),
+            'detected': detected[name],
+            'detection_rate': round(detected[name] / len(ms), 4),
+            'ms_per_frame': round(float(ms.mean()), 3),
+            'ms_p50': round(float(np.percentile(ms, 50)), 3),
+            'ms_p95': round(float(np.percentile(ms, 95)), 3),
+        }
+    return results
+
+def compare_results(results, baseline, slowdown=0.15, rate_drop=0.02):
+    """
+    Compare results against a baseline run
+    
+    Args:
+        results, baseline: Method results as returned by benchmark_methods
+        slowdown: Flag methods whose median ms/frame grew by more than this fraction
+        rate_drop: Flag methods whose detection rate fell by more than this
+        
+    Returns:
+        List of regression messages, empty if there are none
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base['ms_p50'] > 0 and result['ms_p50'] > base['ms_p50'] * (1 + slowdown):
+            regressions.append(f"{name}: {result['ms_p50']:.2f} ms/frame vs {base['ms_p50']:.2f} "
+                               f"(+{(result['ms_p50'] / base['ms_p50'] - 1) * 100:.0f}%)")
+        if result['detection_rate'] < base['detection_rate'] - rate_drop:
+            regressions.append(f"{name}: detection rate {result['detection_rate'] * 100:.1f}% vs "
+                               f"{base['detection_rate'] * 100:.1f}%")
+    return regressions
+
+def print_results(results, baseline=None):
+    print(f"\n{'Method':<24}{'Frames':>8}{'Detected':>10}{'ms p50':>9}{'ms p95':>9}{'vs base':>9}")
+    for name, r in results.items():
+        change = ""
+        if baseline and name in baseline and baseline[name]['ms_p50'] > 0:
+            change = f"{(r['ms_p50'] / baseline[name]['ms_p50'] - 1) * 100:+.0f}%"
+        print(f"{name:<24}{r['frames']:>8}{r['detection_rate'] * 100:>9.1f}%"
+              f"{r['ms_p50']:>9.2f}{r['ms_p95']:>9.2f}{change:>9}")
+
+def run_benchmark(args):
+    """Non-interactive benchmark mode, returns the process exit code"""
+    methods = args.methods.split(',') if args.methods else None
+    try:
+        results = benchmark_methods(args.benchmark, methods, width=args.width,
+                                    max_frames=args.max_frames, prefilter=args.prefilter)
+    except (ValueError, ImportError) as e:
+        print(f"Error: {e}")
+        return 2
+    
+    run = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'data': args.benchmark,
+        'width': args.width,
+        'max_frames': args.max_frames,
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'results': results,
+    }
+    
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline_run = json.load(f)
+        baseline = baseline_run['results']
+        settings = ('data', 'width', 'max_frames')
+        if any(baseline_run.get(key) != run[key] for key in settings):
+            print("Warning: the baseline was recorded with different settings: " +
+                  ", ".join(f"{key}={baseline_run.get(key)}" for key in settings))
+    print_results(results, baseline)
+    
+    # Every run is appended to the history
+    if args.history:
+        history = []
+        if os.path.exists(args.history):
+            with open(args.history) as f:
+                history = json.load(f)
+        history.append(run)
+        with open(args.history, 'w') as f:
+            json.dump(history, f, indent=1)
+        print(f"\nRun {len(history)} added to {args.history}")
+    
+    if args.baseline and (args.update_baseline or baseline is None):
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    
+    if baseline is not None:
+        regressions = compare_results(results, baseline, slowdown=args.threshold)
+        if regressions:
+            print(f"\nREGRESSION against {args.baseline} (threshold {args.threshold * 100:.0f}%):")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='QR detection test. Without --benchmark, opens an interactive camera viewer.')
+    parser.add_argument('--benchmark', type=str, default=None,
+                        help='Benchmark every method on this directory of clips and images (or one file)')
+    parser.add_argument('--methods', type=str, default=None,
+                        help='Comma separated detectors (default: all available)')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Also benchmark each method behind the QR prefilter')
+    parser.add_argument('--width', type=int, default=640,
+                        help='Largest processing width')
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='Only use the first N frames of each clip')
+    parser.add_argument('--history', type=str, default='qr_benchmark_history.json',
+                        help='JSON file every run is appended to (empty to disable)')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Compare against this run, saved here first if it does not exist')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Save this run as the new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Flag methods whose median ms/frame grew by more than this fraction')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.benchmark:
+        sys.exit(run_benchmark(args))
+    run_viewer()
+
+def run_viewer():
     # Clear screen for better UI
     os.system('cls' if os.name == 'nt' else 'clear')
     
@@ -39,24 +277,19 @@ def main():
     # Create QR detector
     print("Creating QR Code detector...")
     
-    # Try different QR code detection methods
-    try:
-        # Method 1: QRCodeDetector (newer OpenCV versions)
-        qr_detector = cv2.QRCodeDetector()
-        detection_method = "QRCodeDetector"
-        print(f"Using {detection_method}")
-    except (AttributeError, cv2.error) as e:
-        print(f"Error with QRCodeDetector: {e}")
-        print("Trying alternative method...")
-        
+    # Try the detection backends in order of preference
+    detector = None
+    for name in ("opencv", "pyzbar"):
         try:
-            # Method 2: Try using zbar if installed
-            import pyzbar.pyzbar as pyzbar
-            detection_method = "pyzbar"
-            print(f"Using {detection_method}")
-        except ImportError:
-            print("pyzbar not found. Please install with 'pip install pyzbar'")
-            detection_method = "none"
+            detector = create_detector(name)
+            print(f"Using {detector.name}")
+            break
+        except (ImportError, AttributeError, cv2.error) as e:
+            print(f"Error with {name}: {e}")
+            print("Trying alternative method...")
+    
+    if detector is None:
+        print("No QR detector available. Install OpenCV with QR support or 'pip install pyzbar'")
     
     print("\nQR Code Detection Test")
     print("----------------------")
@@ -83,51 +316,22 @@ def main():
         # Detect QR codes
         detected = False
         
-        if detection_method == "QRCodeDetector":
-            try:
-                # Detect and decode QR codes
-                data, bbox, _ = qr_detector.detectAndDecode(gray)
-                
-                # If a QR code is found
-                if bbox is not None and len(bbox) > 0:
-                    detected = True
-                    # Convert bbox to integer coordinates
-                    bbox = bbox.astype(int)
-                    
-                    # Draw QR code points
-                    for points in bbox:
-                        # Draw polygon around QR code
-                        cv2.polylines(display_frame, [points], True, (0, 255, 0), 2)
-                        
-                        # Draw data if available
-                        if data:
-                            x = points[0][0]
-                            y = points[0][1]
-                            cv2.putText(display_frame, data, (x, y - 10), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            except Exception as e:
-                print(f"Error detecting QR code: {e}")
-                
-        elif detection_method == "pyzbar":
+        if detector is not None:
             try:
-                # Detect and decode with pyzbar
-                decoded_objects = pyzbar.decode(gray)
-                for obj in decoded_objects:
+                for data, (x, y, w, h), points in detector.detect(gray):
                     detected = True
-                    data = obj.data.decode('utf-8')
-                    points = obj.polygon
                     
-                    # Convert points to numpy array for drawing
+                    # Draw polygon around QR code
                     pts = np.array(points, np.int32)
                     pts = pts.reshape((-1, 1, 2))
                     cv2.polylines(display_frame, [pts], True, (0, 255, 0), 2)
                     
-                    # Draw data
-                    x, y, w, h = obj.rect
-                    cv2.putText(display_frame, data, (x, y - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    # Draw data if available
+                    if data:
+                        cv2.putText(display_frame, data, (x, y - 10), 
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
             except Exception as e:
-                print(f"Error detecting QR code with pyzbar: {e}")
+                print(f"Error detecting QR code with {detector.name}: {e}")
         
         # Add detection status to display
         status = "QR Code Detected!" if detected else "No QR Code Detected"
@@ -0,0 +1,42 @@
+import pytest
+
+from route import Route, load_route
+
+FRAME_AREA = 640 * 480
+
+
+def detection(data, size):
+    return (data, (0, 0, size, size), [])
+
+
+def test_load_route_from_list_and_file(tmp_path):
+    assert load_route('A, B,,C') == ['A', 'B', 'C']
+    path = tmp_path / 'route.txt'
+    path.write_text('# dock run\nA\n\nB\n')
+    assert load_route(str(path)) == ['A', 'B']
+
+
+def test_route_needs_a_waypoint():
+    with pytest.raises(ValueError):
+        Route([])
+
+
+def test_route_advances_on_arrival():
+    route = Route(['A', 'B', 'A'], arrive_area=0.15)
+    assert route.select([detection('B', 100), detection('A', 100)]) == [detection('A', 100)]
+
+    # Far away: not arrived yet
+    assert not route.check_arrival((0, 0, 100, 100), FRAME_AREA)
+    assert route.current == 'A'
+
+    assert route.check_arrival((0, 0, 300, 300), FRAME_AREA)
+    assert route.current == 'B'
+    assert route.progress() == 'Waypoint 2/3: B'
+    # A repeated payload only matches at its own position
+    assert route.select([detection('A', 100)]) == []
+
+    assert route.check_arrival((0, 0, 300, 300), FRAME_AREA)
+    assert route.check_arrival((0, 0, 300, 300), FRAME_AREA)
+    assert route.finished and route.current is None
+    assert not route.check_arrival((0, 0, 300, 300), FRAME_AREA)
+    assert route.progress() == 'Route complete (3 waypoints)'
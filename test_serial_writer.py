@@ -0,0 +1,47 @@
+import time
+
+from serial_writer import (MOTOR_FRAME_HEADER, FakeSerial, SerialCommandWriter,
+                           decode_motor_command, describe_command, encode_motor_command)
+
+
+def test_motor_frame_round_trip():
+    for left in range(-100, 101, 2):
+        for right in (-100, -36, 0, 50, 100):
+            frame = encode_motor_command(left, right)
+            assert len(frame) == 4
+            assert decode_motor_command(frame) == (left, right)
+
+
+def test_motor_frame_clamps_speeds():
+    assert decode_motor_command(encode_motor_command(250, -250)) == (100, -100)
+
+
+def test_motor_frame_payload_is_never_ascii_or_header():
+    for left in range(-100, 101):
+        frame = encode_motor_command(left, -left)
+        assert frame[0] == MOTOR_FRAME_HEADER
+        assert all(0x80 <= b < MOTOR_FRAME_HEADER for b in frame[1:])
+
+
+def test_malformed_motor_frames_are_rejected():
+    frame = encode_motor_command(40, -20)
+    assert decode_motor_command(frame[:3]) is None
+    assert decode_motor_command(b'F' + frame[1:]) is None
+    assert decode_motor_command(frame[:3] + bytes([frame[3] ^ 0x01])) is None
+    assert describe_command(frame) == 'L+40 R-20'
+
+
+def test_writer_coalesces_and_flushes_on_close():
+    port = FakeSerial()
+    writer = SerialCommandWriter(port, min_interval=0.2, keepalive_interval=10.0)
+    writer.submit('F')
+    deadline = time.time() + 1.0
+    while not port.writes and time.time() < deadline:
+        time.sleep(0.005)
+    # Submitted within min_interval of 'F', only the last one is written
+    writer.submit('L')
+    writer.submit('R')
+    writer.submit('S')
+    writer.close()
+    assert [command for _, command in port.commands()] == ['F', 'S']
+    assert writer.commands_coalesced == 2